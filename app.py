@@ -1,15 +1,21 @@
+import os
+import sqlite3
 import streamlit as st
-import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
+import profiler
 from student_records import (
     create_tables, add_student, get_students, update_student, delete_student,
-    add_attendance, get_attendance, update_attendance, delete_attendance,
-    get_students_with_attendance, get_attendance_summary, get_average_grade,
-    get_attendance_by_date_range, seed_data, get_attendance_by_date,
-    delete_attendance_by_student_date, get_attendance_matrix, update_attendance_matrix
+    add_attendance, update_attendance, delete_attendance, get_attendance_summary,
+    get_average_grade, get_attendance_by_date_range, seed_data, clear_attendance_range,
+    mark_all, get_attendance_frame, diff_attendance_frames, get_students_page,
+    get_attendance_page, get_students_with_attendance_page, PAGE_SIZE,
+    get_attendance_summary_by_date_range, get_daily_attendance_rates, get_attendance_rates,
+    generate_data, diff_student_frames, apply_student_changes, get_compacted_terms,
+    get_archived_partitions
 )
 
-# Initialize database
+# Initialize database (a single version check once the schema is current).
+# pandas and the exporter, ingest and reports modules are imported by the pages that use them.
 create_tables()
 
 # Page configuration
@@ -18,18 +24,66 @@ st.set_page_config(page_title="Student Records Management", page_icon="📚", la
 # Title
 st.title("📚 Student Records Management System")
 
+def paginate(key, fetch, cursor_of):
+    """Show Previous/Next controls for a keyset-paginated query and return the current page.
+
+    fetch(cursor, limit) returns rows after cursor; cursor_of(row) gives the cursor for the next page.
+    The cursors of earlier pages are kept in session state so Previous can step back.
+    """
+    cursors = st.session_state.setdefault(f"{key}_cursors", [None])
+    rows = fetch(cursors[-1], PAGE_SIZE + 1)
+    has_next = len(rows) > PAGE_SIZE
+    rows = rows[:PAGE_SIZE]
+
+    col_prev, col_page, col_next = st.columns([1, 4, 1])
+    with col_prev:
+        if st.button("◀ Previous", key=f"{key}_prev", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+    with col_page:
+        st.caption(f"Page {len(cursors)}")
+    with col_next:
+        if st.button("Next ▶", key=f"{key}_next", disabled=not has_next):
+            cursors.append(cursor_of(rows[-1]))
+            st.rerun()
+    return rows
+
 # Sidebar navigation
-page = st.sidebar.selectbox("Navigation", ["Students", "Attendance", "Reports", "Seed Data"])
+page = st.sidebar.selectbox("Navigation", ["Students", "Attendance", "Reports", "Seed Data", "Diagnostics"])
 
 if page == "Students":
+    import pandas as pd
     st.header("👨‍🎓 Student Management")
 
     # Display current students
     st.subheader("Current Students")
-    students = get_students()
+    search = st.text_input("Search by name")
+    students = paginate(f"students_{search}",
+                        lambda after_id, limit: get_students_page(after_id or 0, limit, search or None),
+                        lambda s: s[0])
     if students:
         df_students = pd.DataFrame(students, columns=["ID", "Name", "Grade"])
-        st.dataframe(df_students, use_container_width=True)
+        # Edit, add and delete rows in place; Save applies the whole page in one transaction
+        edited_students = st.data_editor(
+            df_students,
+            column_config={
+                "ID": st.column_config.NumberColumn("ID", disabled=True),
+                "Name": st.column_config.TextColumn("Name"),
+                "Grade": st.column_config.NumberColumn("Grade", min_value=0.0, max_value=100.0, step=0.1),
+            },
+            key=f"students_editor_{search}_{students[0][0]}",
+            use_container_width=True,
+            num_rows="dynamic"
+        )
+        if st.button("💾 Save Student Changes", type="primary"):
+            added, updated, deleted = diff_student_frames(df_students, edited_students)
+            if added or updated or deleted:
+                apply_student_changes(added, updated, deleted)
+                st.success(f"✅ Students saved! ({len(added)} added, {len(updated)} updated, "
+                           f"{len(deleted)} deleted with their attendance)")
+                st.rerun()
+            else:
+                st.info("No changes detected.")
     else:
         st.info("No students found. Add some below!")
 
@@ -52,8 +106,10 @@ if page == "Students":
         if selected_student:
             student_id = student_options[selected_student]
             with st.form(f"update_student_form_{student_id}"):
-                new_name = st.text_input("New Name", value=next(s[1] for s in students if s[0] == student_id))
-                new_grade = st.number_input("New Grade", value=float(next(s[2] for s in students if s[0] == student_id)),
+                _, current_name, current_grade = next(s for s in students if s[0] == student_id)
+                new_name = st.text_input("New Name", value=current_name)
+                # A student added without a grade starts from an empty input, which update_student leaves as it is
+                new_grade = st.number_input("New Grade", value=None if current_grade is None else float(current_grade),
                                           min_value=0.0, max_value=100.0, step=0.1)
                 update_submitted = st.form_submit_button("Update Student")
                 if update_submitted:
@@ -72,6 +128,7 @@ if page == "Students":
             st.rerun()
 
 elif page == "Attendance":
+    import pandas as pd
     st.header("📅 Attendance Management")
 
     # Get students for attendance recording
@@ -88,7 +145,7 @@ elif page == "Attendance":
         while len(weekdays) < 5:
             if current_date.weekday() < 5:  # Monday=0, Tuesday=1, ..., Friday=4
                 weekdays.append(current_date)
-            current_date -= pd.Timedelta(days=1)
+            current_date -= timedelta(days=1)
 
         default_start = weekdays[-1]  # Last (earliest) weekday
         default_end = weekdays[0]     # Today (or last weekday)
@@ -103,27 +160,23 @@ elif page == "Attendance":
         if start_date > end_date:
             st.error("Start date cannot be after end date.")
         else:
-            # Get attendance matrix
-            attendance_matrix = get_attendance_matrix(str(start_date), str(end_date))
-
-            # Create date range
-            date_range = pd.date_range(start=start_date, end=end_date).strftime('%Y-%m-%d').tolist()
+            # Get attendance grid: one row per student, one categorical column per date
+            df = get_attendance_frame(str(start_date), str(end_date))
+            date_range = list(df.columns[3:])
+
+            # Compacted terms and archived partitions are read-only until expanded or unarchived
+            read_only = [(first, last) for first, last, _ in get_compacted_terms() + get_archived_partitions()
+                         if first <= str(end_date) and last >= str(start_date)]
+            locked = {date for date in date_range if any(first <= date <= last for first, last in read_only)}
+            read_only_message = ("Compacted or archived dates are read-only: " +
+                                 ", ".join(f"{first} to {last}" for first, last in read_only) +
+                                 ". Run `expand` or `unarchive` from the command line to edit them.")
+            if locked:
+                st.info(read_only_message)
 
             # Create attendance table with checkboxes
             st.subheader(f"Attendance Matrix ({start_date} to {end_date})")
 
-            # Prepare data for display
-            table_data = []
-            for student in students:
-                student_id, name, grade = student
-                row = {"Student": name, "ID": student_id, "Grade": grade}
-                for date in date_range:
-                    status = attendance_matrix.get(student_id, {}).get(date, "Not Recorded")
-                    row[date] = status
-                table_data.append(row)
-
-            df = pd.DataFrame(table_data)
-
             # Display the table with checkboxes for editing
             edited_df = st.data_editor(
                 df,
@@ -134,7 +187,8 @@ elif page == "Attendance":
                     **{date: st.column_config.SelectboxColumn(
                         date,
                         options=["Not Recorded", "Present", "Absent"],
-                        required=False
+                        required=False,
+                        disabled=date in locked
                     ) for date in date_range}
                 },
                 use_container_width=True,
@@ -143,27 +197,20 @@ elif page == "Attendance":
 
             # Save changes button
             if st.button("💾 Save Attendance Changes", type="primary"):
-                changes_made = False
-                attendance_updates = {}
-
-                for idx, row in edited_df.iterrows():
-                    student_id = int(row["ID"])
-                    student_name = row["Student"]
-
-                    for date in date_range:
-                        new_status = row[date]
-                        old_status = attendance_matrix.get(student_id, {}).get(date, "Not Recorded")
-
-                        if new_status != old_status and new_status != "Not Recorded":
-                            if student_id not in attendance_updates:
-                                attendance_updates[student_id] = {}
-                            attendance_updates[student_id][date] = new_status
-                            changes_made = True
-
-                if changes_made:
-                    update_attendance_matrix(attendance_updates)
-                    st.success("✅ Attendance records updated successfully!")
-                    st.rerun()
+                upserts, deletes = diff_attendance_frames(df, edited_df)
+
+                if upserts or deletes:
+                    import ingest
+                    try:
+                        # Shares a transaction with any other sessions saving at the same moment
+                        ingest.submit(upserts, deletes).result()
+                    except sqlite3.IntegrityError as e:
+                        # e.g. the term was compacted or archived since this page was loaded
+                        st.error(f"Attendance not saved: {e}")
+                    else:
+                        st.success(f"✅ Attendance records updated successfully! "
+                                   f"({len(upserts)} saved, {len(deletes)} cleared)")
+                        st.rerun()
                 else:
                     st.info("No changes detected.")
 
@@ -171,78 +218,48 @@ elif page == "Attendance":
             st.subheader("Quick Actions")
             col1, col2, col3, col4 = st.columns(4)
 
-            with col1:
-                if st.button("Mark All Present for Selected Dates"):
-                    attendance_updates = {}
-                    for student in students:
-                        student_id = student[0]
-                        for date in date_range:
-                            if attendance_matrix.get(student_id, {}).get(date, "Not Recorded") != "Present":
-                                if student_id not in attendance_updates:
-                                    attendance_updates[student_id] = {}
-                                attendance_updates[student_id][date] = "Present"
-                    if attendance_updates:
-                        update_attendance_matrix(attendance_updates)
-                        st.success("All students marked as Present!")
-                        st.rerun()
-
-            with col2:
-                if st.button("Mark All Absent for Selected Dates"):
-                    attendance_updates = {}
-                    for student in students:
-                        student_id = student[0]
-                        for date in date_range:
-                            if attendance_matrix.get(student_id, {}).get(date, "Not Recorded") != "Absent":
-                                if student_id not in attendance_updates:
-                                    attendance_updates[student_id] = {}
-                                attendance_updates[student_id][date] = "Absent"
-                    if attendance_updates:
-                        update_attendance_matrix(attendance_updates)
-                        st.success("All students marked as Absent!")
-                        st.rerun()
+            for column, status in ((col1, "Present"), (col2, "Absent")):
+                with column:
+                    if st.button(f"Mark All {status} for Selected Dates"):
+                        if locked:
+                            st.error(read_only_message)
+                        else:
+                            try:
+                                if mark_all(status, str(start_date), str(end_date)):
+                                    st.success(f"All students marked as {status}!")
+                                    st.rerun()
+                            except sqlite3.IntegrityError as e:
+                                st.error(f"Attendance not saved: {e}")
 
             with col3:
                 if st.button("Clear All for Selected Dates"):
-                    for student in students:
-                        student_id = student[0]
-                        for date in date_range:
-                            if student_id in attendance_matrix and date in attendance_matrix[student_id]:
-                                delete_attendance_by_student_date(student_id, date)
-                    st.success("All attendance records cleared for selected dates!")
-                    st.rerun()
+                    # Clearing only reaches live rows, so it would leave read-only dates as they are
+                    if locked:
+                        st.error(read_only_message)
+                    else:
+                        clear_attendance_range(str(start_date), str(end_date))
+                        st.success("All attendance records cleared for selected dates!")
+                        st.rerun()
 
             with col4:
                 if st.button("📊 View Summary"):
-                    total_days = len(date_range)
-                    summary_data = []
-                    for student in students:
-                        student_id, name, grade = student
-                        present_count = 0
-                        absent_count = 0
-                        for date in date_range:
-                            status = attendance_matrix.get(student_id, {}).get(date, "Not Recorded")
-                            if status == "Present":
-                                present_count += 1
-                            elif status == "Absent":
-                                absent_count += 1
-
-                        attendance_rate = (present_count / total_days * 100) if total_days > 0 else 0
-                        summary_data.append({
-                            "Student": name,
-                            "Present": present_count,
-                            "Absent": absent_count,
-                            "Not Recorded": total_days - present_count - absent_count,
-                            "Attendance Rate": f"{attendance_rate:.1f}%"
-                        })
-
-                    summary_df = pd.DataFrame(summary_data)
+                    rates = get_attendance_rates(str(start_date), str(end_date))
+                    summary_df = pd.DataFrame({
+                        "Student": rates["name"],
+                        "Present": rates["present"],
+                        "Absent": rates["absent"],
+                        "Not Recorded": rates["not_recorded"],
+                        "Attendance Rate": [f"{rate:.1f}%" for rate in rates["rate"]]
+                    })
                     st.dataframe(summary_df, use_container_width=True)
 
         # Individual record management (advanced)
         with st.expander("Advanced: Individual Record Management"):
             # Display current attendance
             st.subheader("Current Attendance Records")
-            attendance = get_attendance()
+            attendance = paginate("attendance",
+                                  lambda after_id, limit: get_attendance_page(after_id or 0, limit),
+                                  lambda a: a[0])
             if attendance:
                 df_attendance = pd.DataFrame(attendance, columns=["ID", "Student ID", "Date", "Status"])
                 st.dataframe(df_attendance, use_container_width=True)
@@ -259,9 +276,14 @@ elif page == "Attendance":
                 add_submitted = st.form_submit_button("Add Attendance")
                 if add_submitted and selected_student:
                     student_id = student_options[selected_student]
-                    add_attendance(student_id, str(date), status)
-                    st.success("Attendance record added successfully!")
-                    st.rerun()
+                    try:
+                        add_attendance(student_id, str(date), status)
+                    except sqlite3.IntegrityError as e:
+                        # e.g. the date is in a compacted term or an archived partition
+                        st.error(f"Attendance not saved: {e}")
+                    else:
+                        st.success("Attendance record added successfully!")
+                        st.rerun()
 
             # Update attendance
             st.subheader("Update Attendance Record")
@@ -274,9 +296,13 @@ elif page == "Attendance":
                         new_status = st.selectbox("New Status", ["Present", "Absent"])
                         update_submitted = st.form_submit_button("Update Attendance")
                         if update_submitted:
-                            update_attendance(attendance_id, new_status)
-                            st.success("Attendance updated successfully!")
-                            st.rerun()
+                            try:
+                                update_attendance(attendance_id, new_status)
+                            except sqlite3.IntegrityError as e:
+                                st.error(f"Attendance not saved: {e}")
+                            else:
+                                st.success("Attendance updated successfully!")
+                                st.rerun()
 
             # Delete attendance
             st.subheader("Delete Attendance Record")
@@ -289,11 +315,12 @@ elif page == "Attendance":
                     st.rerun()
 
 elif page == "Reports":
+    import pandas as pd
     st.header("📊 Reports & Summaries")
 
     # Students with attendance
     st.subheader("Students with Attendance Records")
-    joined_data = get_students_with_attendance()
+    joined_data = paginate("joined", get_students_with_attendance_page, lambda r: (r[0], r[3]))
     if joined_data:
         df_joined = pd.DataFrame(joined_data, columns=["Student ID", "Name", "Grade", "Date", "Status"])
         st.dataframe(df_joined, use_container_width=True)
@@ -331,9 +358,52 @@ elif page == "Reports":
         if filtered:
             df_filtered = pd.DataFrame(filtered, columns=["ID", "Student ID", "Date", "Status"])
             st.dataframe(df_filtered, use_container_width=True)
+
+            range_summary = get_attendance_summary_by_date_range(str(start_date), str(end_date))
+            st.dataframe(pd.DataFrame(range_summary, columns=["Status", "Count"]), use_container_width=True)
+
+            daily_rates = get_daily_attendance_rates(str(start_date), str(end_date))
+            df_rates = pd.DataFrame(daily_rates, columns=["Date", "Present", "Absent", "Attendance Rate (%)"])
+            st.line_chart(df_rates.set_index("Date")["Attendance Rate (%)"])
+
+            # Per-student rates, aggregated in parallel chunks of the range
+            import reports
+            student_rates = reports.attendance_rates(str(start_date), str(end_date))
+            st.dataframe(pd.DataFrame({
+                "Student ID": student_rates["student_id"],
+                "Student": student_rates["name"],
+                "Present": student_rates["present"],
+                "Absent": student_rates["absent"],
+                "Not Recorded": student_rates["not_recorded"],
+                "Attendance Rate (%)": student_rates["rate"],
+            }), use_container_width=True)
         else:
             st.info("No records found in the selected date range.")
 
+    # Export
+    st.subheader("Export Data")
+    col1, col2 = st.columns(2)
+    with col1:
+        export_kind = st.selectbox("Dataset", ["attendance", "students", "students_with_attendance"])
+    with col2:
+        export_format = st.selectbox("Format", ["csv", "jsonl", "parquet"])
+
+    def export_file():
+        # Runs only when the button is clicked; streams to a temporary file rather than memory
+        import exporter
+        import tempfile
+        export_dir = tempfile.mkdtemp()
+        path = os.path.join(export_dir, f"{export_kind}.{export_format}")
+        exporter.export(export_kind, path, export_format, str(start_date), str(end_date))
+        f = open(path, "rb")
+        # The open handle keeps the data readable after the file is unlinked
+        os.remove(path)
+        os.rmdir(export_dir)
+        return f
+
+    st.download_button(f"⬇️ Download {export_kind} ({start_date} to {end_date})", data=export_file,
+                       file_name=f"{export_kind}_{start_date}_{end_date}.{export_format}")
+
 elif page == "Seed Data":
     st.header("🌱 Seed Example Data")
     st.write("Click the button below to add example students and attendance records to the database.")
@@ -343,4 +413,56 @@ elif page == "Seed Data":
         st.success("Example data seeded successfully!")
         st.rerun()
 
-    st.info("This will add 3 students and 6 attendance records for demonstration purposes.")
\ No newline at end of file
+    st.info("This will add 3 students and 6 attendance records for demonstration purposes.")
+
+    # Synthetic data at scale
+    st.subheader("Generate Synthetic Data")
+    with st.form("generate_data_form"):
+        col1, col2 = st.columns(2)
+        with col1:
+            num_students = st.number_input("Students", min_value=1, value=1000, step=100)
+            num_days = st.number_input("School Days", min_value=1, value=180, step=5)
+        with col2:
+            absence_probability = st.slider("Absence Probability", min_value=0.0, max_value=1.0, value=0.05)
+            seed = st.number_input("Random Seed", min_value=0, value=0, step=1)
+        generate_start = st.date_input("First School Day", value=datetime(2023, 9, 1))
+        if st.form_submit_button("Generate"):
+            students_added, rows_added = generate_data(int(num_students), int(num_days), absence_probability,
+                                                       int(seed), str(generate_start))
+            st.success(f"Generated {students_added} students and {rows_added} attendance records!")
+
+elif page == "Diagnostics":
+    import pandas as pd
+    st.header("🩺 Diagnostics")
+    st.write("Call counts, time and rows returned for every student_records function while profiling is on. "
+             f"Calls slower than {profiler.SLOW_THRESHOLD_MS:.0f} ms keep the query plans of their statements.")
+
+    profiling_on = st.toggle("Profiling enabled", value=profiler.enabled())
+    if profiling_on != profiler.enabled():
+        if profiling_on:
+            profiler.enable()
+        else:
+            profiler.disable()
+        st.rerun()
+    if st.button("Reset Statistics"):
+        profiler.reset()
+        st.rerun()
+
+    stats = profiler.stats()
+    if stats:
+        df_stats = pd.DataFrame(stats).rename(columns={
+            "function": "Function", "calls": "Calls", "total_ms": "Total (ms)", "mean_ms": "Mean (ms)",
+            "max_ms": "Max (ms)", "rows": "Rows"})
+        st.dataframe(df_stats, use_container_width=True)
+    else:
+        st.info("No calls recorded yet. Enable profiling and use the other pages.")
+
+    st.subheader("Slow Calls")
+    slow_calls = profiler.slow_calls()
+    for call in reversed(slow_calls):
+        with st.expander(f"{call['function']} — {call['ms']:.1f} ms"):
+            for statement in call["statements"]:
+                st.code(statement["sql"] + "\n\n" + "\n".join(statement["plan"]), language="sql")
+    if not slow_calls:
+        st.info("No slow calls recorded.")
+
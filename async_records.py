@@ -0,0 +1,184 @@
+import asyncio
+import functools
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import cache
+import db
+import student_records
+
+# student_records functions exposed as coroutines, by how they touch the database
+READ_FUNCTIONS = (
+    'get_students', 'get_attendance', 'get_students_with_attendance', 'get_attendance_summary',
+    'get_average_grade', 'get_attendance_by_date_range', 'get_attendance_matrix', 'get_attendance_by_date',
+    'get_students_page', 'get_attendance_page', 'get_students_with_attendance_page',
+    'get_attendance_summary_by_date_range', 'get_daily_attendance_rates', 'get_attendance_rates',
+    'get_attendance_frame', 'get_compacted_terms', 'get_archived_partitions',
+)
+WRITE_FUNCTIONS = (
+    'add_student', 'update_student', 'delete_student', 'add_students', 'update_students', 'delete_students',
+    'apply_student_changes', 'add_attendance', 'update_attendance',
+    'delete_attendance', 'update_attendance_matrix', 'delete_attendance_by_student_date',
+    'apply_attendance_changes', 'clear_attendance_range', 'mark_all', 'seed_data',
+    'compact_attendance', 'expand_attendance', 'archive_attendance', 'unarchive_attendance',
+)
+
+# Most rows folded into one transaction by the writer thread; a plain call counts as one row
+MAX_BATCH_ROWS = 5000
+
+class _Write:
+    __slots__ = ('func', 'args', 'kwargs', 'rows', 'deadline', 'future')
+
+    def __init__(self, func, args, kwargs, rows, deadline):
+        self.func, self.args, self.kwargs, self.rows, self.deadline = func, args, kwargs, rows, deadline
+        self.future = Future()
+
+class RecordsWriter:
+    """One thread that applies student_records writes, many to a transaction.
+
+    submit() returns a concurrent.futures.Future that resolves to the write's result once the
+    transaction holding it has committed with synchronous=FULL, so a result means durable. Every
+    write already queued when the thread wakes up, up to max_rows rows, is applied in a single
+    transaction, each inside its own savepoint so one failing write does not undo the others. A
+    write may let the thread wait up to max_delay_ms for more writes to join its transaction.
+    """
+
+    def __init__(self, max_rows=MAX_BATCH_ROWS):
+        self.max_rows = max_rows
+        self._writes = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='records-writer', daemon=True)
+        self._thread.start()
+
+    @property
+    def running(self):
+        return self._thread.is_alive()
+
+    def submit(self, func, args=(), kwargs=None, rows=1, max_delay_ms=0):
+        """Queue func(*args, **kwargs) to run on the writer thread; returns a Future."""
+        write = _Write(func, args, kwargs or {}, rows, time.monotonic() + max_delay_ms / 1000)
+        self._writes.put(write)
+        return write.future
+
+    def flush(self):
+        """A Future that resolves once every write queued before it has been applied."""
+        return self.submit(None)
+
+    def close(self):
+        """Finish queued writes, then stop the writer thread."""
+        self._writes.put(None)
+        self._thread.join()
+
+    def _run(self):
+        stop = False
+        while not stop:
+            write = self._writes.get()
+            if write is None:
+                break
+            batch = [write]
+            rows = write.rows
+            deadline = write.deadline
+            # Coalesce whatever else is already waiting, or arrives before a write's delay runs out
+            while rows < self.max_rows:
+                remaining = deadline - time.monotonic()
+                try:
+                    write = self._writes.get(timeout=remaining) if remaining > 0 else self._writes.get_nowait()
+                except queue.Empty:
+                    break
+                if write is None:
+                    stop = True
+                    break
+                batch.append(write)
+                rows += write.rows
+                deadline = min(deadline, write.deadline)
+            self._apply(batch)
+        db.close_connections()
+
+    def _apply(self, batch):
+        writes = [write for write in batch if write.func is not None]
+        outcomes = {}
+        if writes:
+            conn = student_records.get_connection()
+            # The connections default to synchronous=NORMAL, which may lose the last commits on power loss
+            conn.execute('PRAGMA synchronous = FULL')
+            try:
+                with db.transaction(conn):
+                    for write in writes:
+                        conn.execute('SAVEPOINT async_write')
+                        try:
+                            result = write.func(*write.args, **write.kwargs)
+                        except Exception as e:
+                            conn.execute('ROLLBACK TO async_write')
+                            conn.execute('RELEASE async_write')
+                            outcomes[write] = (None, e)
+                        else:
+                            conn.execute('RELEASE async_write')
+                            outcomes[write] = (result, None)
+            except Exception as e:
+                # The commit itself failed, so none of the batch is durable
+                outcomes = {write: (None, e) for write in writes}
+            # Per-call invalidation ran before the commit; make sure readers see the committed state
+            cache.invalidate()
+        for write in batch:
+            result, error = outcomes.get(write, (None, None))
+            if error is not None:
+                write.future.set_exception(error)
+            else:
+                write.future.set_result(result)
+
+_default_writer = None
+_default_lock = threading.Lock()
+
+def default_writer():
+    """The process-wide writer, started on first use; AsyncStudentRecords and ingest share it."""
+    global _default_writer
+    with _default_lock:
+        if _default_writer is None or not _default_writer.running:
+            _default_writer = RecordsWriter()
+        return _default_writer
+
+class AsyncStudentRecords:
+    """Asyncio front end to student_records that never blocks the event loop.
+
+    Reads run on a small pool of threads, each with its own connection. Writes go through the
+    process-wide RecordsWriter, which applies concurrent writes together in one transaction.
+    Use as `async with AsyncStudentRecords() as store:` or call close() when done.
+    """
+
+    def __init__(self, readers=4, writer=None):
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix='records-reader')
+        self._writer = writer or default_writer()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """Wait for queued writes, then stop the reader pool."""
+        await asyncio.wrap_future(self._writer.flush())
+        self._readers.shutdown(wait=True)
+
+    async def _read(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, functools.partial(func, *args, **kwargs))
+
+    async def _write(self, func, *args, **kwargs):
+        return await asyncio.wrap_future(self._writer.submit(func, args, kwargs))
+
+def _method(name, kind):
+    func = getattr(student_records, name)
+
+    async def method(self, *args, **kwargs):
+        return await getattr(self, kind)(func, *args, **kwargs)
+    method.__name__ = name
+    method.__qualname__ = f'AsyncStudentRecords.{name}'
+    method.__doc__ = func.__doc__
+    return method
+
+for _name in READ_FUNCTIONS:
+    setattr(AsyncStudentRecords, _name, _method(_name, '_read'))
+for _name in WRITE_FUNCTIONS:
+    setattr(AsyncStudentRecords, _name, _method(_name, '_write'))
@@ -0,0 +1,169 @@
+import argparse
+import gzip
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+
+import cache
+import db
+import migrations
+import student_records
+
+# Snapshots go here unless told otherwise, and this many of the newest are kept
+BACKUP_DIR = 'backups'
+KEEP = 7
+
+# Pages copied per step, and seconds between steps, so a large copy never holds the database for long
+STEP_PAGES = 1024
+STEP_SLEEP = 0.005
+
+PREFIX = 'student_records-'
+SUFFIXES = ('.db', '.db.gz')
+
+def list_backups(directory=BACKUP_DIR):
+    """Snapshots in a directory as (path, bytes, modified datetime), newest first."""
+    if not os.path.isdir(directory):
+        return []
+    names = sorted((name for name in os.listdir(directory)
+                    if name.startswith(PREFIX) and name.endswith(SUFFIXES)), reverse=True)
+    paths = [os.path.join(directory, name) for name in names]
+    return [(path, os.path.getsize(path), datetime.fromtimestamp(os.path.getmtime(path))) for path in paths]
+
+def rotate(directory=BACKUP_DIR, keep=KEEP):
+    """Delete all but the newest `keep` snapshots; returns the deleted paths."""
+    stale = [path for path, _, _ in list_backups(directory)[keep:]]
+    for path in stale:
+        os.remove(path)
+    return stale
+
+def _partition_files(conn):
+    """Files of the archived attendance partitions a database refers to."""
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'attendance_partitions'").fetchone() is None:
+        return []
+    return [file for file, in conn.execute('SELECT file FROM attendance_partitions')]
+
+def _copy_file(source, target):
+    """Copy a file unless target already exists; partition files never change, so one copy serves all."""
+    if not os.path.exists(target):
+        shutil.copyfile(source, target + '.partial')
+        os.replace(target + '.partial', target)
+
+def backup(directory=BACKUP_DIR, compress=False, keep=KEEP, pages=STEP_PAGES, sleep=STEP_SLEEP, progress=None):
+    """Copy the live database into a new snapshot file without blocking the app.
+
+    Pages are copied `pages` at a time with `sleep` seconds between steps. Readers and writers
+    carry on throughout, and the snapshot is the database as of the moment the backup started.
+    progress(status, remaining, total) is called after each step. With compress
+    the snapshot is gzipped. Snapshots beyond the newest `keep` are then deleted; keep=None
+    keeps them all. Archived attendance partitions are copied next to the snapshots, once each.
+    Returns the snapshot path.
+    """
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, f"{PREFIX}{datetime.now():%Y%m%d-%H%M%S-%f}.db")
+    path = base + '.gz' if compress else base
+    # Half-written files never match list_backups(), so rotation and restore cannot pick them up
+    copy = base + '.partial'
+
+    source = db.connect(student_records.DB_FILE)
+    target = sqlite3.connect(copy)
+    def step(status, remaining, total):
+        # Connection.backup itself only sleeps after SQLITE_BUSY or SQLITE_LOCKED, so the pause
+        # between steps that gives the CPU and the disk back to the app is taken here
+        if progress is not None:
+            progress(status, remaining, total)
+        if remaining and sleep:
+            time.sleep(sleep)
+
+    try:
+        # One read transaction pins a single WAL snapshot across every step, so the copy is
+        # consistent and never restarts when the app commits in the middle of it
+        source.execute('BEGIN')
+        source.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+        source.backup(target, pages=pages, progress=step, sleep=sleep)
+        for file in _partition_files(source):
+            _copy_file(student_records._partition_path(file), os.path.join(directory, file))
+        source.execute('COMMIT')
+        # A self-contained file: no -wal to carry around with the snapshot
+        target.execute('PRAGMA journal_mode = DELETE')
+    except BaseException:
+        target.close()
+        os.remove(copy)
+        raise
+    finally:
+        source.close()
+    target.close()
+
+    if compress:
+        with open(copy, 'rb') as raw, gzip.open(path + '.partial', 'wb', compresslevel=6) as packed:
+            shutil.copyfileobj(raw, packed, 1024 * 1024)
+        os.remove(copy)
+        copy = path + '.partial'
+    os.replace(copy, path)
+    if keep is not None:
+        rotate(directory, keep)
+    return path
+
+def _open_snapshot(snapshot, scratch):
+    """Connect to a snapshot, unpacking a .gz one into the scratch directory first."""
+    if snapshot.endswith('.gz'):
+        unpacked = os.path.join(scratch, 'snapshot.db')
+        with gzip.open(snapshot, 'rb') as packed, open(unpacked, 'wb') as raw:
+            shutil.copyfileobj(packed, raw, 1024 * 1024)
+        snapshot = unpacked
+    elif not os.path.exists(snapshot):
+        raise FileNotFoundError(snapshot)
+    return sqlite3.connect(f'file:{snapshot}?mode=ro', uri=True)
+
+@cache.invalidates
+def restore(snapshot):
+    """Replace the contents of the live database with a snapshot, then migrate it to the current schema.
+
+    The snapshot is integrity-checked first, and the partition files it refers to are copied
+    back from beside it if missing. Connections already open see the restored data on their
+    next statement. Returns the schema version after migrating.
+    """
+    with tempfile.TemporaryDirectory() as scratch:
+        source = _open_snapshot(snapshot, scratch)
+        try:
+            check = source.execute('PRAGMA integrity_check').fetchone()[0]
+            if check != 'ok':
+                raise ValueError(f"{snapshot} failed its integrity check: {check}")
+            for file in _partition_files(source):
+                _copy_file(os.path.join(os.path.dirname(snapshot), file), student_records._partition_path(file))
+            target = db.connect(student_records.DB_FILE)
+            try:
+                # One step: the restore is all-or-nothing for other connections
+                source.backup(target)
+            finally:
+                target.close()
+        finally:
+            source.close()
+    student_records.create_tables()
+    return migrations.get_version(student_records.get_connection())
+
+def main(argv):
+    """Command-line entry point: backup create [--dir D] [--keep N] [--compress] | list | restore SNAPSHOT."""
+    parser = argparse.ArgumentParser(prog='student_records.py backup')
+    commands = parser.add_subparsers(dest='command', required=True)
+    create = commands.add_parser('create', help='write a new snapshot')
+    create.add_argument('--dir', default=BACKUP_DIR)
+    create.add_argument('--keep', type=int, default=KEEP, help='snapshots to keep (default %(default)s)')
+    create.add_argument('--compress', action='store_true', help='gzip the snapshot')
+    listing = commands.add_parser('list', help='show snapshots, newest first')
+    listing.add_argument('--dir', default=BACKUP_DIR)
+    restoring = commands.add_parser('restore', help='replace the database with a snapshot')
+    restoring.add_argument('snapshot')
+    args = parser.parse_args(argv)
+
+    if args.command == 'create':
+        path = backup(args.dir, args.compress, args.keep)
+        print(f"Wrote {path} ({os.path.getsize(path):,} bytes).")
+    elif args.command == 'list':
+        for path, size, modified in list_backups(args.dir):
+            print(f"{modified:%Y-%m-%d %H:%M:%S}  {size:>14,}  {path}")
+    else:
+        restore(args.snapshot)
+        print(f"Restored {student_records.DB_FILE} from {args.snapshot}.")
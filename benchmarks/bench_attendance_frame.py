@@ -0,0 +1,53 @@
+"""Build time of the Attendance page grid: dict matrix plus Python loops versus get_attendance_frame.
+
+Usage: python benchmarks/bench_attendance_frame.py [students] [days]
+"""
+import os
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import pandas as pd
+
+import db
+import student_records
+from common import best_of, temporary_database
+
+def populate(students, days):
+    conn = student_records.get_connection()
+    dates = [str(date(2023, 9, 1) + timedelta(days=i)) for i in range(days)]
+    with db.transaction(conn):
+        conn.executemany('INSERT INTO students (name, grade) VALUES (?, ?)',
+                         ((f'Student {i}', 80.0) for i in range(students)))
+        conn.executemany('INSERT INTO attendance (student_id, date, status) VALUES (?, ?, ?)',
+                         ((sid, student_records.to_day(d), 2 if (sid + i) % 7 == 0 else 1)
+                          for sid in range(1, students + 1) for i, d in enumerate(dates)))
+    return dates[0], dates[-1]
+
+def legacy_grid(start, end):
+    # What the Attendance page did before get_attendance_frame existed
+    students = student_records.get_students()
+    attendance_matrix = student_records.get_attendance_matrix(start, end)
+    date_range = pd.date_range(start=start, end=end).strftime('%Y-%m-%d').tolist()
+    table_data = []
+    for student_id, name, grade in students:
+        row = {"Student": name, "ID": student_id, "Grade": grade}
+        for day in date_range:
+            row[day] = attendance_matrix.get(student_id, {}).get(day, "Not Recorded")
+        table_data.append(row)
+    return pd.DataFrame(table_data)
+
+def main():
+    students = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+    with temporary_database():
+        start, end = populate(students, days)
+        legacy = best_of(legacy_grid, start, end)
+        frame = best_of(student_records.get_attendance_frame.uncached, start, end)
+    print(f"{students} students x {days} days")
+    print(f"dict matrix + loops      {legacy:8.3f} s")
+    print(f"get_attendance_frame     {frame:8.3f} s  ({legacy / frame:.1f}x)")
+
+if __name__ == '__main__':
+    main()
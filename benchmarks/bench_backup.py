@@ -0,0 +1,57 @@
+"""Roll-call write latency while an online backup runs, versus with no backup running.
+
+Usage: python benchmarks/bench_backup.py [students] [days]
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import backup
+import db
+import student_records
+from common import percentile, temporary_database
+
+def write_latencies(day, student_ids, until):
+    # One teacher saving a class register over and over until until() says stop
+    latencies = []
+    status = 'Present'
+    while not until():
+        start = time.perf_counter()
+        student_records.update_attendance_matrix({sid: {day: status} for sid in student_ids})
+        latencies.append(time.perf_counter() - start)
+        status = 'Absent' if status == 'Present' else 'Present'
+        time.sleep(0.005)
+    db.close_connections()
+    return latencies
+
+def main():
+    students = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 180
+    with temporary_database(students, days, seed=1) as path:
+        day = student_records.school_days('2023-09-01', days)[-1]
+        class_ids = range(1, 31)
+        db_size = os.path.getsize(path)
+
+        deadline = time.perf_counter() + 1
+        idle = write_latencies(day, class_ids, lambda: time.perf_counter() > deadline)
+
+        done = threading.Event()
+        during = []
+        writer = threading.Thread(target=lambda: during.extend(write_latencies(day, class_ids, done.is_set)))
+        writer.start()
+        start = time.perf_counter()
+        snapshot = backup.backup(os.path.join(os.path.dirname(path), 'backups'))
+        backup_s = time.perf_counter() - start
+        done.set()
+        writer.join()
+    print(f"{students} students x {days} days, {db_size / 1e6:.1f} MB; backup took {backup_s:.2f} s "
+          f"({os.path.basename(snapshot)})")
+    for label, latencies in (('no backup', idle), ('during backup', during)):
+        print(f"{label:14} {len(latencies):5} saves  p50 {percentile(latencies, 0.5) * 1000:7.2f} ms  "
+              f"p99 {percentile(latencies, 0.99) * 1000:7.2f} ms  max {max(latencies) * 1000:7.2f} ms")
+
+if __name__ == '__main__':
+    main()
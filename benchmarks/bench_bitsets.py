@@ -0,0 +1,55 @@
+"""Storage size and range read time of attendance rows versus compacted bitset terms.
+
+Usage: python benchmarks/bench_bitsets.py [students] [days]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import student_records
+from common import best_of, temporary_database
+
+START_DATE = '2023-09-01'
+
+def attendance_bytes(conn):
+    # Pages used by attendance data only; the students and count tables are the same either way
+    return conn.execute('''
+        SELECT SUM(pgsize) FROM dbstat
+        WHERE name IN ('attendance', 'idx_attendance_student_date', 'idx_attendance_date',
+                       'attendance_bitsets', 'attendance_terms')
+    ''').fetchone()[0]
+
+def timings(start, end):
+    return (best_of(student_records.get_attendance_matrix.uncached, start, end),
+            best_of(student_records.get_attendance_by_date_range.uncached, start, end))
+
+def main():
+    students = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 180
+    with temporary_database(students, days, seed=1, start_date=START_DATE):
+        dates = student_records.school_days(START_DATE, days)
+        # A month in the middle of the term
+        month = (dates[days // 2], dates[min(days - 1, days // 2 + 21)])
+        conn = student_records.get_connection()
+        conn.execute('VACUUM')
+        rows_size = attendance_bytes(conn)
+        rows_matrix, rows_range = timings(*month)
+
+        start = time.perf_counter()
+        student_records.compact_attendance(dates[0], dates[-1])
+        compact_s = time.perf_counter() - start
+        conn.execute('VACUUM')
+        bits_size = attendance_bytes(conn)
+        bits_matrix, bits_range = timings(*month)
+    print(f"{students} students x {days} days, reading {month[0]} to {month[1]}; compaction took {compact_s:.2f} s")
+    print(f"attendance storage       rows {rows_size / 1e6:8.2f} MB  bitsets {bits_size / 1e6:8.2f} MB  "
+          f"({rows_size / bits_size:.0f}x smaller)")
+    print(f"get_attendance_matrix    rows {rows_matrix:8.3f} s   bitsets {bits_matrix:8.3f} s   "
+          f"({rows_matrix / bits_matrix:.1f}x)")
+    print(f"get_attendance_by_date_range rows {rows_range:.3f} s   bitsets {bits_range:8.3f} s   "
+          f"({rows_range / bits_range:.1f}x)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""Per-call latency of a fresh connection per call versus the pooled connection.
+
+Usage: python benchmarks/bench_connections.py [calls]
+"""
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import student_records
+from common import temporary_database
+
+def legacy_add_attendance(student_id, date, status):
+    # The pre-pooling pattern: connect, execute, commit, close on every call
+    conn = sqlite3.connect(student_records.DB_FILE)
+    conn.execute('''
+        INSERT INTO attendance (student_id, date, status) VALUES (?, ?, ?)
+        ON CONFLICT (student_id, date) DO UPDATE SET status = excluded.status
+    ''', (student_id, student_records.to_day(date), student_records.to_status_code(status)))
+    conn.commit()
+    conn.close()
+
+def legacy_get_attendance_by_date(date):
+    conn = sqlite3.connect(student_records.DB_FILE)
+    records = conn.execute('SELECT student_id, status FROM attendance WHERE date = ?',
+                           (student_records.to_day(date),)).fetchall()
+    conn.close()
+    return dict(records)
+
+def timed(label, func, calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        func(i)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed / calls * 1e6:10.1f} us/call")
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with temporary_database():
+        student_records.add_student('Bench Student', 90.0)
+
+        timed('write, connection per call (before)', lambda i: legacy_add_attendance(1, '2023-09-01', 'Present'), calls)
+        timed('write, pooled connection (after)', lambda i: student_records.add_attendance(1, '2023-09-02', 'Present'), calls)
+        timed('read, connection per call (before)', lambda i: legacy_get_attendance_by_date('2023-09-01'), calls)
+        # uncached, so the pooled read is timed against the database rather than the read cache
+        timed('read, pooled connection (after)',
+              lambda i: student_records.get_attendance_by_date.uncached('2023-09-02'), calls)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Attendance storage and range scans: TEXT dates and statuses versus integer day numbers and codes.
+
+Builds one generated database, copies its attendance into a table with the pre-version-5 TEXT
+layout and indexes, then compares pages used and the time of the same range queries on both.
+
+Usage: python benchmarks/bench_encoding.py [students] [days]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import student_records
+from common import best_of, temporary_database
+
+START_DATE = '2023-09-01'
+
+def build_text_copy(conn):
+    conn.execute('''
+        CREATE TABLE attendance_text (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            status TEXT NOT NULL
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO attendance_text
+        SELECT id, student_id, date(date * 86400, 'unixepoch'), CASE status WHEN 1 THEN 'Present' ELSE 'Absent' END
+        FROM attendance
+    ''')
+    conn.execute('CREATE UNIQUE INDEX idx_attendance_text_student_date ON attendance_text (student_id, date)')
+    conn.execute('CREATE INDEX idx_attendance_text_date ON attendance_text (date, student_id, status)')
+
+def pages(conn, table):
+    # The table plus its indexes
+    return conn.execute('''
+        SELECT SUM(pgsize) FROM dbstat
+        WHERE name IN (SELECT name FROM sqlite_master WHERE tbl_name = ?)
+    ''', (table,)).fetchone()[0]
+
+def main():
+    students = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 180
+    with temporary_database(students, days, seed=1, start_date=START_DATE):
+        conn = student_records.get_connection()
+        build_text_copy(conn)
+        conn.execute('VACUUM')
+        dates = student_records.school_days(START_DATE, days)
+        month = (dates[days // 2], dates[min(days - 1, days // 2 + 21)])
+        text_params = month
+        int_params = tuple(student_records.to_day(d) for d in month)
+        queries = {
+            'range rows': 'SELECT student_id, date, status FROM {} WHERE date BETWEEN ? AND ?',
+            'range counts': 'SELECT status, COUNT(*) FROM {} WHERE date BETWEEN ? AND ? GROUP BY status',
+            'per-day counts': 'SELECT date, status, COUNT(*) FROM {} WHERE date BETWEEN ? AND ? GROUP BY date, status',
+        }
+        print(f"{students} students x {days} days, ranges {month[0]} to {month[1]}")
+        text_size, int_size = pages(conn, 'attendance_text'), pages(conn, 'attendance')
+        print(f"{'table + indexes':<16} text {text_size / 1e6:9.2f} MB   integer {int_size / 1e6:9.2f} MB  "
+              f"({text_size / int_size:.2f}x smaller)")
+        for name, sql in queries.items():
+            text = best_of(lambda: conn.execute(sql.format('attendance_text'), text_params).fetchall(), repeat=5)
+            encoded = best_of(lambda: conn.execute(sql.format('attendance'), int_params).fetchall(), repeat=5)
+            print(f"{name:<16} text {text * 1000:9.1f} ms   integer {encoded * 1000:9.1f} ms  ({text / encoded:.2f}x)")
+
+if __name__ == '__main__':
+    main()
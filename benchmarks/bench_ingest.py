@@ -0,0 +1,54 @@
+"""Concurrent roll-call throughput: each thread calling update_attendance_matrix versus the ingest queue.
+
+Usage: python benchmarks/bench_ingest.py [teachers] [submissions per teacher] [class size]
+"""
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import db
+import ingest
+import student_records
+from common import temporary_database
+
+def roll_call(teacher, submission, class_size):
+    day = student_records.school_days('2023-09-01', submission + 1)[-1]
+    first = teacher * class_size + 1
+    return {sid: {day: 'Present' if (sid + submission) % 9 else 'Absent'} for sid in range(first, first + class_size)}
+
+def run(teachers, submissions, class_size, submit):
+    def teacher_thread(teacher):
+        for submission in range(submissions):
+            submit(roll_call(teacher, submission, class_size))
+        db.close_connections()
+
+    threads = [threading.Thread(target=teacher_thread, args=(t,)) for t in range(teachers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start
+
+def via_queue(attendance_data):
+    upserts = [(sid, day, status) for sid, days in attendance_data.items() for day, status in days.items()]
+    ingest.submit(upserts).result()
+
+def main():
+    teachers = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+    submissions = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    class_size = int(sys.argv[3]) if len(sys.argv) > 3 else 30
+    rows = teachers * submissions * class_size
+    with temporary_database(teachers * class_size, 1):
+        direct = run(teachers, submissions, class_size, student_records.update_attendance_matrix)
+        queued = run(teachers, submissions, class_size, via_queue)
+        ingest.default_queue().close()
+    print(f"{teachers} teachers x {submissions} submissions x {class_size} students = {rows} cells")
+    print(f"direct update_attendance_matrix  {rows / direct:12,.0f} cells/s")
+    print(f"ingest queue                     {rows / queued:12,.0f} cells/s  ({direct / queued:.1f}x)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Current-term reads and roll-call writes with all history in DB_FILE versus old years archived to partitions.
+
+Usage: python benchmarks/bench_partitions.py [students] [years]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import student_records
+from common import best_of, temporary_database
+
+START_DATE = '2021-09-01'
+# School days generated per year
+YEAR_DAYS = 180
+
+def roll_call(day, students):
+    # Alternate statuses between saves
+    status = ['Absent']
+
+    def save():
+        status[0] = 'Present' if status[0] == 'Absent' else 'Absent'
+        student_records.update_attendance_matrix({sid: {day: status[0]} for sid in range(1, students + 1)})
+    return save
+
+def timings(month, save):
+    # One unmeasured save first, so each measured one flips every cell rather than matching it
+    save()
+    return (best_of(student_records.get_attendance_matrix.uncached, *month, repeat=5),
+            best_of(student_records.get_attendance_by_date_range.uncached, *month, repeat=5),
+            best_of(save, repeat=5))
+
+def main():
+    students = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    years = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    with temporary_database(students, years * YEAR_DAYS, seed=1, start_date=START_DATE):
+        dates = student_records.school_days(START_DATE, years * YEAR_DAYS)
+        current = dates[(years - 1) * YEAR_DAYS:]
+        month = (current[YEAR_DAYS // 2], current[YEAR_DAYS // 2 + 21])
+        save = roll_call(current[-1], students)
+        conn = student_records.get_connection()
+        conn.execute('VACUUM')
+        single_size = os.path.getsize(student_records.DB_FILE)
+        single = timings(month, save)
+
+        start = time.perf_counter()
+        for year in range(years - 1):
+            student_records.archive_attendance(dates[year * YEAR_DAYS], dates[(year + 1) * YEAR_DAYS - 1])
+        archive_s = time.perf_counter() - start
+        conn.execute('VACUUM')
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        hot_size = os.path.getsize(student_records.DB_FILE)
+        partitioned = timings(month, save)
+    print(f"{students} students x {years} years of {YEAR_DAYS} days, reading {month[0]} to {month[1]}; "
+          f"archiving {years - 1} years took {archive_s:.2f} s")
+    print(f"DB_FILE size                  single {single_size / 1e6:8.2f} MB  partitioned {hot_size / 1e6:8.2f} MB")
+    for label, before, after in zip(('get_attendance_matrix', 'get_attendance_by_date_range', 'roll call save'),
+                                    single, partitioned):
+        print(f"{label:29} single {before * 1000:8.2f} ms  partitioned {after * 1000:8.2f} ms  ({before / after:.2f}x)")
+
+if __name__ == '__main__':
+    main()
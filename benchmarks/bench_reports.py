@@ -0,0 +1,33 @@
+"""Year-long per-student rates: a single connection versus the parallel report engine.
+
+Usage: python benchmarks/bench_reports.py [students] [days] [workers]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import reports
+import student_records
+from common import best_of, temporary_database
+
+START_DATE = '2023-09-01'
+
+def main():
+    students = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 180
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count()
+    with temporary_database(students, days, seed=1, start_date=START_DATE):
+        dates = student_records.school_days(START_DATE, days)
+        first, last = dates[0], dates[-1]
+        rates = [('get_attendance_rates', best_of(student_records.get_attendance_rates.uncached, first, last))]
+        for processes in (False, True):
+            label = 'processes' if processes else 'threads'
+            rates.append((f'reports, {workers} {label}', best_of(reports.attendance_rates.uncached, first, last,
+                                                                 workers=workers, processes=processes)))
+    print(f"{students} students x {days} days, {os.cpu_count()} CPUs")
+    for label, seconds in rates:
+        print(f"{label:32} {seconds:8.3f} s  ({rates[0][1] / seconds:.2f}x)")
+
+if __name__ == '__main__':
+    main()
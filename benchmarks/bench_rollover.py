@@ -0,0 +1,62 @@
+"""End-of-year rollover: one call and commit per student versus the batch student APIs.
+
+Deletes a graduating class with its attendance, regrades the remaining students and enrolls a
+new class, first student by student, then through delete_students, update_students and add_students.
+
+Usage: python benchmarks/bench_rollover.py [students] [days] [class size]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import student_records
+from common import temporary_database
+
+def rollover(students, days, graduating, batch):
+    with temporary_database(students, days, seed=1):
+        graduates = range(1, graduating + 1)
+        regrades = [(sid, None, 60.0 + sid % 40) for sid in range(graduating + 1, students + 1)]
+        enrolled = [(f'New Student {i}', 0.0) for i in range(graduating)]
+        timings = []
+
+        start = time.perf_counter()
+        if batch:
+            student_records.delete_students(graduates)
+        else:
+            for sid in graduates:
+                student_records.delete_student(sid)
+        timings.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        if batch:
+            student_records.update_students(regrades)
+        else:
+            for sid, name, grade in regrades:
+                student_records.update_student(sid, name, grade)
+        timings.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        if batch:
+            student_records.add_students(enrolled)
+        else:
+            for name, grade in enrolled:
+                student_records.add_student(name, grade)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def main():
+    students = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 180
+    graduating = int(sys.argv[3]) if len(sys.argv) > 3 else 1000
+    single = rollover(students, days, graduating, batch=False)
+    batch = rollover(students, days, graduating, batch=True)
+    print(f"{students} students x {days} days, {graduating} graduating")
+    for label, before, after in zip(('delete graduates', 'regrade the rest', 'enroll new class'), single, batch):
+        print(f"{label:18} per student {before:8.3f} s  batch {after:8.3f} s  ({before / after:.1f}x)")
+    print(f"{'total':18} per student {sum(single):8.3f} s  batch {sum(batch):8.3f} s  "
+          f"({sum(single) / sum(batch):.1f}x)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Scaling of update_attendance_matrix with grid size, per-cell path versus bulk upsert.
+
+Usage: python benchmarks/bench_update_matrix.py
+"""
+import os
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import student_records
+from common import temporary_database
+
+GRIDS = [(50, 5), (100, 20), (500, 20), (1000, 20)]
+
+def legacy_update_attendance_matrix(attendance_data):
+    # The pre-upsert implementation: SELECT, then UPDATE or INSERT, for every cell
+    conn = sqlite3.connect(student_records.DB_FILE)
+    cursor = conn.cursor()
+    for student_id, dates in attendance_data.items():
+        for day, status in dates.items():
+            day, status = student_records.to_day(day), student_records.to_status_code(status)
+            cursor.execute('SELECT id FROM attendance WHERE student_id = ? AND date = ?', (student_id, day))
+            if cursor.fetchone():
+                cursor.execute('UPDATE attendance SET status = ? WHERE student_id = ? AND date = ?',
+                               (status, student_id, day))
+            else:
+                cursor.execute('INSERT INTO attendance (student_id, date, status) VALUES (?, ?, ?)',
+                               (student_id, day, status))
+    conn.commit()
+    conn.close()
+
+def make_grid(students, days, status):
+    dates = [str(date(2023, 9, 1) + timedelta(days=i)) for i in range(days)]
+    return {sid: {d: status for d in dates} for sid in range(1, students + 1)}
+
+def timed(func, grid):
+    start = time.perf_counter()
+    func(grid)
+    return time.perf_counter() - start
+
+def main():
+    print(f"{'grid':>12} {'cells':>8} {'per-cell (s)':>14} {'upsert (s)':>12} {'speedup':>8}")
+    for students, days in GRIDS:
+        # Attendance needs existing students now that foreign keys are enforced
+        with temporary_database(students, 0):
+            # First pass inserts every cell, second pass flips every status
+            legacy = timed(legacy_update_attendance_matrix, make_grid(students, days, 'Present'))
+            legacy += timed(legacy_update_attendance_matrix, make_grid(students, days, 'Absent'))
+            student_records.get_connection().execute('DELETE FROM attendance')
+            bulk = timed(student_records.update_attendance_matrix, make_grid(students, days, 'Present'))
+            bulk += timed(student_records.update_attendance_matrix, make_grid(students, days, 'Absent'))
+        print(f"{students:>6}x{days:<5} {students * days:>8} {legacy:>14.3f} {bulk:>12.3f} {legacy / bulk:>7.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""Setup and statistics shared by the benchmark scripts, which put the project root on sys.path first."""
+import contextlib
+import os
+import tempfile
+import time
+
+import db
+import student_records
+
+@contextlib.contextmanager
+def temporary_database(students=0, days=0, **generate_kwargs):
+    """Point student_records at a new database in a temporary directory for the duration of the block.
+
+    With students, it is filled by generate_data(students, days, **generate_kwargs) first. Yields
+    the database path; this thread's connections are closed before the directory is removed.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        student_records.DB_FILE = os.path.join(tmp, 'bench.db')
+        try:
+            student_records.create_tables()
+            if students:
+                student_records.generate_data(students, days, **generate_kwargs)
+            yield student_records.DB_FILE
+        finally:
+            db.close_connections()
+
+def best_of(func, *args, repeat=3, **kwargs):
+    """The fastest of repeat calls of func(*args, **kwargs), in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def percentile(values, fraction):
+    """The value fraction (0 to 1) of the way through the sorted values, at the nearest index."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))]
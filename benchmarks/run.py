@@ -0,0 +1,157 @@
+"""Benchmark suite for the student_records hot paths.
+
+Builds a synthetic database for each size, times each operation and prints JSON with
+p50/p99 latency and throughput. Pass --compare with an earlier result file to flag
+regressions; the exit status is 1 when any p50 got slower than the threshold allows.
+
+Usage: python benchmarks/run.py [--sizes 1000x20,10000x60] [--repeat 30] [--output results.json]
+                                [--compare baseline.json] [--threshold 0.25]
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import student_records
+from common import percentile, temporary_database
+
+DEFAULT_SIZES = '1000x20,10000x60'
+START_DATE = '2023-09-01'
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def measure(func, repeat):
+    """Call func(i) repeat times; returns (latencies in seconds, rows returned per call)."""
+    latencies = []
+    rows = 0
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = func(i)
+        latencies.append(time.perf_counter() - start)
+        if isinstance(result, (list, dict)):
+            rows = len(result)
+        elif isinstance(result, tuple):
+            # (inserted, updated) from the write paths
+            rows = sum(result)
+    return latencies, rows
+
+def summarize(latencies, rows):
+    ordered = sorted(latencies)
+    total = sum(ordered)
+    return {
+        'calls': len(ordered),
+        'p50_ms': round(percentile(ordered, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 3),
+        'mean_ms': round(total / len(ordered) * 1000, 3),
+        'ops_per_s': round(len(ordered) / total, 1),
+        'rows_per_call': rows,
+        'rows_per_s': round(rows * len(ordered) / total, 1),
+    }
+
+def cases(students, days):
+    """The operations to time, as name -> func(i). Reads bypass the cache to time the database."""
+    dates = student_records.school_days(START_DATE, days)
+    week_start, week_end = dates[0], dates[min(4, days - 1)]
+    grid_students = range(1, min(students, 100) + 1)
+    grid_dates = dates[:5]
+
+    def update_grid(i):
+        status = 'Absent' if i % 2 == 0 else 'Present'
+        return student_records.update_attendance_matrix({sid: {d: status for d in grid_dates} for sid in grid_students})
+
+    def cli(*argv, module=True):
+        # A fresh interpreter per call, as kiosk and cron scripts run it: imports, connection,
+        # schema version check and the command itself. `python -m` runs from cached bytecode;
+        # `python student_records.py` compiles the whole file on every call
+        command = ['-m', 'student_records'] if module else [os.path.join(ROOT, 'student_records.py')]
+        env = dict(os.environ, STUDENT_RECORDS_DB=student_records.DB_FILE)
+        subprocess.run([sys.executable, *command, *argv], cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL)
+
+    return {
+        'get_attendance_matrix': lambda i: student_records.get_attendance_matrix.uncached(week_start, week_end),
+        'update_attendance_matrix': update_grid,
+        'get_attendance_by_date_range': lambda i: student_records.get_attendance_by_date_range.uncached(
+            week_start, week_end),
+        'get_students_with_attendance': lambda i: student_records.get_students_with_attendance.uncached(),
+        'get_attendance_summary': lambda i: student_records.get_attendance_summary.uncached(),
+        # Interpreter start-up alone, to tell the CLI's own cold-start cost apart from Python's
+        'python_startup': lambda i: subprocess.run([sys.executable, '-c', 'pass'], check=True),
+        'cli_summary_cold_start': lambda i: cli('summary'),
+        'cli_script_summary_cold_start': lambda i: cli('summary', module=False),
+        'cli_mark_cold_start': lambda i: cli('mark', 'Absent' if i % 2 == 0 else 'Present', '1',
+                                             '--date', grid_dates[0]),
+        # Deletes from the end so the grid students above stay in place
+        'delete_student': lambda i: student_records.delete_student(students - i),
+    }
+
+def run_size(students, days, repeat):
+    results = {}
+    with temporary_database():
+        start = time.perf_counter()
+        student_records.generate_data(students, days, seed=1, start_date=START_DATE)
+        results['build_s'] = round(time.perf_counter() - start, 3)
+        for name, func in cases(students, days).items():
+            # Heavy full-table reads get fewer repetitions at large sizes
+            calls = repeat if name != 'get_students_with_attendance' else max(3, repeat // 10)
+            results[name] = summarize(*measure(func, calls))
+    return results
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'commit': commit or None,
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'machine': platform.machine(),
+    }
+
+def compare(current, baseline, threshold):
+    """Return human-readable regressions of p50 latency beyond threshold (a fraction)."""
+    regressions = []
+    for size, operations in current['sizes'].items():
+        for name, stats in operations.items():
+            old = baseline.get('sizes', {}).get(size, {}).get(name)
+            if not isinstance(stats, dict) or not old:
+                continue
+            if stats['p50_ms'] > old['p50_ms'] * (1 + threshold):
+                regressions.append(f"{size} {name}: p50 {old['p50_ms']} ms -> {stats['p50_ms']} ms")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='comma-separated STUDENTSxDAYS')
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--output', help='write the JSON results to this file')
+    parser.add_argument('--compare', help='earlier results file to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed p50 slowdown (0.25 = 25%%)')
+    args = parser.parse_args()
+
+    results = {'environment': environment(), 'repeat': args.repeat, 'sizes': {}}
+    for size in args.sizes.split(','):
+        students, days = (int(part) for part in size.lower().split('x'))
+        results['sizes'][size] = run_size(students, days, args.repeat)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+if __name__ == '__main__':
+    main()
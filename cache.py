@@ -0,0 +1,69 @@
+import functools
+import os
+import threading
+from collections import OrderedDict
+
+# Maximum number of cached read results kept across all functions
+MAX_ENTRIES = 256
+
+_entries = OrderedDict()
+_lock = threading.Lock()
+_generation = 0
+
+def generation():
+    """Return the current write generation."""
+    return _generation
+
+def invalidate():
+    """Start a new generation and drop every cached result."""
+    global _generation
+    with _lock:
+        _generation += 1
+        _entries.clear()
+
+def file_signature(path):
+    """Modification stamps of a database and its WAL, so writes from other processes are noticed."""
+    signature = []
+    for name in (path, path + '-wal'):
+        try:
+            stat = os.stat(name)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+def cached(path_func):
+    """Decorator factory caching a read function per database path, generation and arguments.
+
+    Results are shared between callers and must be treated as read-only.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            path = path_func()
+            # Generation is read before the query so a result that races a write is filed under
+            # the old generation and never served afterwards
+            key = (func.__name__, path, _generation, file_signature(path), args, tuple(sorted(kwargs.items())))
+            with _lock:
+                if key in _entries:
+                    _entries.move_to_end(key)
+                    return _entries[key]
+            result = func(*args, **kwargs)
+            with _lock:
+                _entries[key] = result
+                while len(_entries) > MAX_ENTRIES:
+                    _entries.popitem(last=False)
+            return result
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+def invalidates(func):
+    """Decorator for write functions: bump the generation once the write has finished."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            invalidate()
+    return wrapper
@@ -0,0 +1,61 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Pragmas applied to every connection handed out by this module
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('mmap_size', 256 * 1024 * 1024),
+    ('cache_size', -64 * 1024),
+    ('temp_store', 'MEMORY'),
+    ('busy_timeout', 5000),
+    # Enforce REFERENCES clauses, including ON DELETE CASCADE from students to attendance
+    ('foreign_keys', 'ON'),
+)
+
+# Number of compiled statements sqlite3 keeps per connection
+STATEMENT_CACHE_SIZE = 256
+
+_local = threading.local()
+
+def connect(path):
+    """Open a new tuned connection in autocommit mode."""
+    # uri=True lets ATTACH take file: URIs such as the read-only attendance partitions
+    conn = sqlite3.connect(path, isolation_level=None, cached_statements=STATEMENT_CACHE_SIZE, uri=True)
+    for name, value in PRAGMAS:
+        conn.execute(f'PRAGMA {name} = {value}')
+    return conn
+
+def get_connection(path):
+    """Return this thread's connection to path, opening it on first use."""
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(path)
+    if conn is None:
+        conn = connections[path] = connect(path)
+    return conn
+
+def close_connections():
+    """Close every connection opened by the current thread."""
+    connections = getattr(_local, 'connections', {})
+    for conn in connections.values():
+        conn.close()
+    connections.clear()
+
+@contextmanager
+def transaction(conn, mode='IMMEDIATE'):
+    """Run a block in one explicit transaction, rolling back on error."""
+    if conn.in_transaction:
+        # Already inside an outer transaction; let it own the commit
+        yield conn
+        return
+    conn.execute(f'BEGIN {mode}')
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
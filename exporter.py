@@ -0,0 +1,132 @@
+import argparse
+import csv
+import json
+import os
+
+import db
+import student_records
+
+# Rows fetched and written per chunk
+CHUNK_SIZE = 10000
+
+FORMATS = ('csv', 'jsonl', 'parquet')
+
+# Columns of each export as (name, pyarrow type name)
+COLUMNS = {
+    'students': (('id', 'int64'), ('name', 'string'), ('grade', 'float64')),
+    'attendance': (('id', 'int64'), ('student_id', 'int64'), ('date', 'string'), ('status', 'string')),
+    'students_with_attendance': (('student_id', 'int64'), ('name', 'string'), ('grade', 'float64'),
+                                 ('date', 'string'), ('status', 'string')),
+}
+
+STUDENTS_SQL = '''
+    SELECT id, name, grade FROM students
+    WHERE :ids IS NULL OR id IN (SELECT value FROM json_each(:ids))
+    ORDER BY id
+'''
+
+# Rows a student can bring to the joined export (a school year), which is read a batch of students at a time
+ROWS_PER_STUDENT = 200
+
+def _decode_attendance(rows):
+    to_date, statuses = student_records.to_date, student_records.STATUS_CATEGORIES
+    return [(id_, student_id, to_date(day), statuses[status]) for id_, student_id, day, status in rows]
+
+def _decode_joined(rows):
+    to_date, statuses = student_records.to_date, student_records.STATUS_CATEGORIES
+    return [(student_id, name, grade, to_date(day), None if status is None else statuses[status])
+            for student_id, name, grade, day, status in rows]
+
+# Turns stored day numbers and status codes back into ISO dates and status names
+DECODERS = {
+    'students': None,
+    'attendance': _decode_attendance,
+    'students_with_attendance': _decode_joined,
+}
+
+def iter_chunks(kind, start_date=None, end_date=None, student_ids=None, chunk_size=CHUNK_SIZE):
+    """Yield lists of rows of an export, read on a dedicated connection about chunk_size rows at a time.
+
+    Attendance includes archived partitions and compacted terms, whose records have no id.
+    """
+    first, last = student_records._day_range(start_date, end_date)
+    decode = DECODERS[kind]
+    conn = db.connect(student_records.DB_FILE)
+    try:
+        if kind == 'students':
+            ids = student_records._student_ids_param(student_ids)
+            chunks = student_records._fetch_batches(conn, STUDENTS_SQL, {'ids': ids}, chunk_size)
+        elif kind == 'attendance':
+            chunks = student_records._iter_attendance_rows(conn, first, last, student_ids, chunk_size)
+        else:
+            chunks = student_records._iter_joined_rows(conn, first, last, student_ids,
+                                                       max(1, chunk_size // ROWS_PER_STUDENT))
+        for rows in chunks:
+            yield rows if decode is None else decode(rows)
+    finally:
+        conn.close()
+
+def _write_csv(chunks, names, path):
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(names)
+        for rows in chunks:
+            writer.writerows(rows)
+            count += len(rows)
+    return count
+
+def _write_jsonl(chunks, names, path):
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        for rows in chunks:
+            f.writelines(json.dumps(dict(zip(names, row))) + '\n' for row in rows)
+            count += len(rows)
+    return count
+
+def _write_parquet(chunks, columns, path):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet export requires pyarrow (pip install pyarrow)") from None
+    schema = pa.schema([(name, getattr(pa, type_name)()) for name, type_name in columns])
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for rows in chunks:
+            arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            count += len(rows)
+    return count
+
+def export(kind, path, fmt=None, start_date=None, end_date=None, student_ids=None, chunk_size=CHUNK_SIZE):
+    """Stream an export ('students', 'attendance' or 'students_with_attendance') to a file.
+
+    fmt is 'csv', 'jsonl' or 'parquet', inferred from the file extension when omitted.
+    Only one chunk is held in memory at a time. Returns the number of rows written.
+    """
+    if kind not in COLUMNS:
+        raise ValueError(f"unknown export {kind!r}; expected one of {', '.join(COLUMNS)}")
+    fmt = fmt or os.path.splitext(path)[1].lstrip('.').lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format {fmt!r}; expected one of {', '.join(FORMATS)}")
+    columns = COLUMNS[kind]
+    chunks = iter_chunks(kind, start_date, end_date, student_ids, chunk_size)
+    if fmt == 'parquet':
+        return _write_parquet(chunks, columns, path)
+    names = [name for name, _ in columns]
+    return (_write_csv if fmt == 'csv' else _write_jsonl)(chunks, names, path)
+
+def main(argv):
+    """Command-line entry point: export KIND PATH [--format F] [--start D] [--end D] [--students IDS]."""
+    parser = argparse.ArgumentParser(prog='student_records.py export')
+    parser.add_argument('kind', choices=sorted(COLUMNS))
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=FORMATS)
+    parser.add_argument('--start', type=student_records._date_argument, help='first date (YYYY-MM-DD)')
+    parser.add_argument('--end', type=student_records._date_argument, help='last date (YYYY-MM-DD)')
+    parser.add_argument('--students', help='comma-separated student ids')
+    args = parser.parse_args(argv)
+    student_ids = [int(sid) for sid in args.students.split(',')] if args.students else None
+    count = export(args.kind, args.path, args.format, args.start, args.end, student_ids)
+    print(f"Exported {count} rows to {args.path}.")
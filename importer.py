@@ -0,0 +1,144 @@
+import csv
+import time
+from datetime import date
+from itertools import islice
+
+import cache
+import db
+import student_records
+
+# Rows per executemany call, and rows per transaction
+CHUNK_SIZE = 10000
+TRANSACTION_ROWS = 200000
+
+ATTENDANCE_COLUMNS = ('student_id', 'date', 'status')
+STUDENT_COLUMNS = ('name', 'grade')
+
+def _read_csv(path, columns):
+    """Yield (line number, values) for the given columns of a CSV file with a header row."""
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = [name.strip().lower() for name in next(reader, [])]
+        indexes = [header.index(column) for column in columns]
+        for line, row in enumerate(reader, start=2):
+            yield line, tuple(row[i] if i < len(row) else '' for i in indexes)
+
+def _parquet_file(path):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet import requires pyarrow (pip install pyarrow)") from None
+    return pq.ParquetFile(path)
+
+def _read_parquet(path, columns):
+    """Yield (row number, values) for the given columns of a Parquet file, one record batch at a time."""
+    parquet = _parquet_file(path)
+    number = 1
+    for batch in parquet.iter_batches(batch_size=CHUNK_SIZE, columns=list(columns)):
+        for values in zip(*(batch.column(column).to_pylist() for column in columns)):
+            yield number, values
+            number += 1
+
+def _file_columns(path):
+    """Column names of a CSV or Parquet file, lower-cased."""
+    if path.lower().endswith('.parquet'):
+        return [name.lower() for name in _parquet_file(path).schema_arrow.names]
+    with open(path, newline='', encoding='utf-8') as f:
+        return [name.strip().lower() for name in next(csv.reader(f), [])]
+
+def _attendance_row(values):
+    student_id, day, status = values
+    status = student_records.to_status_code(str(status).strip())
+    day = student_records.to_day(day if isinstance(day, date) else str(day).strip())
+    return int(student_id), day, status
+
+def _student_row(values):
+    if len(values) == 3:
+        student_id, name, grade = values
+        student_id = int(student_id)
+    else:
+        student_id = None
+        name, grade = values
+    name = str(name).strip()
+    if not name:
+        raise ValueError("empty name")
+    grade = float(grade) if grade not in (None, '') else None
+    return student_id, name, grade
+
+ATTENDANCE_SQL = '''
+    INSERT INTO attendance (student_id, date, status) VALUES (?, ?, ?)
+    ON CONFLICT (student_id, date) DO UPDATE SET status = excluded.status
+    WHERE status <> excluded.status
+'''
+
+STUDENT_SQL = '''
+    INSERT INTO students (id, name, grade) VALUES (?, ?, ?)
+    ON CONFLICT (id) DO UPDATE SET name = excluded.name, grade = excluded.grade
+'''
+
+@cache.invalidates
+def import_file(path, table=None, chunk_size=CHUNK_SIZE, errors=None):
+    """Bulk load students or attendance from a CSV or Parquet file.
+
+    table is 'students' or 'attendance'; when omitted it is inferred from the header. Rows that
+    fail validation are skipped and, if errors is a list, appended to it as (row, message).
+    Returns a dict with rows, skipped and seconds.
+    """
+    file_columns = _file_columns(path)
+    if table is None:
+        table = 'attendance' if set(ATTENDANCE_COLUMNS) <= set(file_columns) else 'students'
+    if table == 'attendance':
+        columns, convert, sql = ATTENDANCE_COLUMNS, _attendance_row, ATTENDANCE_SQL
+    elif table == 'students':
+        columns = ('id',) + STUDENT_COLUMNS if 'id' in file_columns else STUDENT_COLUMNS
+        convert, sql = _student_row, STUDENT_SQL
+    else:
+        raise ValueError(f"unknown table {table!r}")
+    missing = [column for column in columns if column not in file_columns]
+    if missing:
+        raise ValueError(f"{path}: missing column(s) {', '.join(missing)}")
+
+    read = _read_parquet if path.lower().endswith('.parquet') else _read_csv
+    records = read(path, columns)
+
+    rows = skipped = 0
+    start = time.perf_counter()
+    conn = db.connect(student_records.DB_FILE)
+    try:
+        # Skip the fsync on each commit; an OS crash can only lose import batches, which are safe to re-run
+        conn.execute('PRAGMA synchronous = OFF')
+        # Foreign keys are enforced, so attendance for unknown students is skipped like any invalid row
+        student_ids = {sid for sid, in conn.execute('SELECT id FROM students')} if table == 'attendance' else None
+        in_transaction = 0
+        while True:
+            batch = list(islice(records, chunk_size))
+            if not batch:
+                break
+            chunk = []
+            for number, values in batch:
+                try:
+                    row = convert(values)
+                    if student_ids is not None and row[0] not in student_ids:
+                        raise ValueError(f"no student with id {row[0]}")
+                    chunk.append(row)
+                except (TypeError, ValueError) as e:
+                    skipped += 1
+                    if errors is not None:
+                        errors.append((number, str(e)))
+            if not conn.in_transaction:
+                conn.execute('BEGIN IMMEDIATE')
+            conn.executemany(sql, chunk)
+            rows += len(chunk)
+            in_transaction += len(chunk)
+            if in_transaction >= TRANSACTION_ROWS:
+                conn.commit()
+                in_transaction = 0
+        if conn.in_transaction:
+            conn.commit()
+    except BaseException:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return {'table': table, 'rows': rows, 'skipped': skipped, 'seconds': time.perf_counter() - start}
@@ -0,0 +1,97 @@
+import queue
+import threading
+
+import async_records
+import student_records
+
+# A batch is written once it holds async_records.MAX_BATCH_ROWS rows or its oldest submission is MAX_DELAY_MS old
+MAX_DELAY_MS = 5
+
+# Submitters block (backpressure) while this many rows are waiting to be written
+MAX_PENDING_ROWS = 100000
+
+UPSERT_SQL = '''
+    INSERT INTO attendance (student_id, date, status) VALUES (?, ?, ?)
+    ON CONFLICT (student_id, date) DO UPDATE SET status = excluded.status
+    WHERE status <> excluded.status
+'''
+
+class AttendanceIngestQueue:
+    """Buffers attendance writes from many threads and commits them together.
+
+    submit() returns a concurrent.futures.Future that resolves to the number of cells in that
+    submission once the transaction containing them has committed with synchronous=FULL. The
+    submissions go to the process-wide async_records writer, which holds each one up to
+    MAX_DELAY_MS for others to join its transaction, so concurrent roll-call saves share the
+    write lock instead of queuing for it one by one.
+    """
+
+    def __init__(self, max_delay_ms=MAX_DELAY_MS, max_pending_rows=MAX_PENDING_ROWS, writer=None):
+        self.max_delay_ms = max_delay_ms
+        self.max_pending_rows = max_pending_rows
+        self._writer = writer or async_records.default_writer()
+        self._pending_rows = 0
+        self._capacity = threading.Condition()
+        self._closed = False
+
+    def submit(self, upserts=(), deletes=(), timeout=None):
+        """Queue (student_id, date, status) upserts and (student_id, date) deletes.
+
+        Blocks while the queue is full; raises queue.Full if timeout seconds pass first.
+        """
+        cells = [(student_id, date, status) for student_id, date, status in upserts]
+        cells.extend((student_id, date, None) for student_id, date in deletes)
+        size = max(len(cells), 1)
+        with self._capacity:
+            if self._closed:
+                raise RuntimeError("ingest queue is closed")
+            # A submission larger than the whole buffer is let through alone rather than waiting forever
+            ready = self._capacity.wait_for(
+                lambda: self._pending_rows == 0 or self._pending_rows + size <= self.max_pending_rows, timeout)
+            if not ready:
+                raise queue.Full("attendance ingest queue is full")
+            self._pending_rows += size
+        future = self._writer.submit(_write, (cells,), rows=size, max_delay_ms=self.max_delay_ms)
+        future.add_done_callback(lambda _: self._release(size))
+        return future
+
+    def close(self):
+        """Write everything already submitted and refuse further submissions."""
+        with self._capacity:
+            self._closed = True
+        self._writer.flush().result()
+
+    def _release(self, size):
+        with self._capacity:
+            self._pending_rows -= size
+            self._capacity.notify_all()
+
+def _write(cells):
+    """Apply one submission on the writer thread, inside the writer's transaction."""
+    # Later cells win for the same student and day; None status means delete
+    latest = {}
+    for student_id, date, status in cells:
+        latest[(student_id, date)] = status
+    to_day = student_records.to_day
+    upserts = [(student_id, to_day(date), student_records.to_status_code(status))
+               for (student_id, date), status in latest.items() if status is not None]
+    deletes = [(student_id, to_day(date)) for (student_id, date), status in latest.items() if status is None]
+    conn = student_records.get_connection()
+    conn.executemany(UPSERT_SQL, upserts)
+    conn.executemany('DELETE FROM attendance WHERE student_id = ? AND date = ?', deletes)
+    return len(cells)
+
+_default_queue = None
+_default_lock = threading.Lock()
+
+def default_queue():
+    """The process-wide ingest queue, started on first use."""
+    global _default_queue
+    with _default_lock:
+        if _default_queue is None:
+            _default_queue = AttendanceIngestQueue()
+        return _default_queue
+
+def submit(upserts=(), deletes=(), timeout=None):
+    """Queue attendance changes on the process-wide ingest queue; returns a Future."""
+    return default_queue().submit(upserts, deletes, timeout)
@@ -0,0 +1,356 @@
+import db
+
+def _create_base_tables(conn):
+    """Version 1: the original students and attendance tables."""
+    # Students table
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS students (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            grade REAL
+        )
+    ''')
+
+    # Attendance table
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS attendance (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            status TEXT NOT NULL,
+            FOREIGN KEY (student_id) REFERENCES students (id)
+        )
+    ''')
+
+def _index_attendance(conn):
+    """Version 2: one record per student per day, plus date range indexes."""
+    # Keep the most recently written row for each (student_id, date)
+    conn.execute('''
+        DELETE FROM attendance
+        WHERE id NOT IN (SELECT MAX(id) FROM attendance GROUP BY student_id, date)
+    ''')
+    create_attendance_indexes(conn)
+
+def create_attendance_indexes(conn):
+    """Create the attendance indexes added by version 2."""
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_student_date ON attendance (student_id, date)')
+    # Covers the matrix and range queries so they never touch the table itself
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_attendance_date ON attendance (date, student_id, status)')
+
+def drop_attendance_indexes(conn):
+    """Drop the attendance indexes, e.g. around a delete of a large share of the table."""
+    conn.execute('DROP INDEX IF EXISTS idx_attendance_student_date')
+    conn.execute('DROP INDEX IF EXISTS idx_attendance_date')
+
+def rebuild_attendance_counts(conn):
+    """Recompute the attendance count tables from the attendance table."""
+    conn.execute('DELETE FROM attendance_daily_counts')
+    conn.execute('DELETE FROM attendance_student_counts')
+    conn.execute('''
+        INSERT INTO attendance_daily_counts (date, status, count)
+        SELECT date, status, COUNT(*) FROM attendance GROUP BY date, status
+    ''')
+    conn.execute('''
+        INSERT INTO attendance_student_counts (student_id, status, count)
+        SELECT student_id, status, COUNT(*) FROM attendance GROUP BY student_id, status
+    ''')
+
+ATTENDANCE_COUNT_TRIGGERS = ('attendance_counts_insert', 'attendance_counts_delete', 'attendance_counts_update')
+
+def create_attendance_count_triggers(conn):
+    """Create the triggers that keep the attendance count tables in step with attendance."""
+    # Each trigger body adds or removes one row's contribution; rows that drop to zero are removed
+    increment = '''
+        INSERT INTO attendance_daily_counts (date, status, count) VALUES (NEW.date, NEW.status, 1)
+            ON CONFLICT (date, status) DO UPDATE SET count = count + 1;
+        INSERT INTO attendance_student_counts (student_id, status, count) VALUES (NEW.student_id, NEW.status, 1)
+            ON CONFLICT (student_id, status) DO UPDATE SET count = count + 1;
+    '''
+    decrement = '''
+        UPDATE attendance_daily_counts SET count = count - 1 WHERE date = OLD.date AND status = OLD.status;
+        DELETE FROM attendance_daily_counts WHERE date = OLD.date AND status = OLD.status AND count <= 0;
+        UPDATE attendance_student_counts SET count = count - 1
+            WHERE student_id = OLD.student_id AND status = OLD.status;
+        DELETE FROM attendance_student_counts
+            WHERE student_id = OLD.student_id AND status = OLD.status AND count <= 0;
+    '''
+    conn.execute(f'CREATE TRIGGER IF NOT EXISTS attendance_counts_insert AFTER INSERT ON attendance BEGIN {increment} END')
+    conn.execute(f'CREATE TRIGGER IF NOT EXISTS attendance_counts_delete AFTER DELETE ON attendance BEGIN {decrement} END')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS attendance_counts_update
+        AFTER UPDATE OF student_id, date, status ON attendance
+        BEGIN {decrement} {increment} END
+    ''')
+
+def drop_attendance_count_triggers(conn):
+    """Drop the count triggers, e.g. around a bulk load followed by rebuild_attendance_counts()."""
+    for name in ATTENDANCE_COUNT_TRIGGERS:
+        conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+
+def _add_attendance_counts(conn):
+    """Version 3: per-day and per-student status counts kept current by triggers."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS attendance_daily_counts (
+            date TEXT NOT NULL,
+            status TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (date, status)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS attendance_student_counts (
+            student_id INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (student_id, status)
+        ) WITHOUT ROWID
+    ''')
+
+    create_attendance_count_triggers(conn)
+    rebuild_attendance_counts(conn)
+
+ATTENDANCE_TERM_TRIGGERS = ('attendance_terms_insert', 'attendance_terms_update')
+
+def create_attendance_term_triggers(conn):
+    """Reject attendance rows dated inside a compacted term; its history lives in attendance_bitsets."""
+    guard = '''
+        WHEN EXISTS (SELECT 1 FROM attendance_terms WHERE NEW.date BETWEEN start_date AND end_date)
+        BEGIN SELECT RAISE(ABORT, 'attendance for a compacted term is read-only'); END
+    '''
+    conn.execute(f'CREATE TRIGGER IF NOT EXISTS attendance_terms_insert BEFORE INSERT ON attendance {guard}')
+    conn.execute(f'CREATE TRIGGER IF NOT EXISTS attendance_terms_update BEFORE UPDATE OF date ON attendance {guard}')
+
+def drop_attendance_term_triggers(conn):
+    """Drop the compacted term guards, once no compacted terms remain."""
+    for name in ATTENDANCE_TERM_TRIGGERS:
+        conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+
+def _add_attendance_bitsets(conn):
+    """Version 4: compacted attendance history, two bits per student per day."""
+    # Terms whose Present/Absent rows were packed into attendance_bitsets
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS attendance_terms (
+            start_date TEXT PRIMARY KEY,
+            end_date TEXT NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    # Bit i of each BLOB (least significant bit first) is day term_start + i: recorded says
+    # a status exists, present says it was Present rather than Absent
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS attendance_bitsets (
+            term_start TEXT NOT NULL,
+            student_id INTEGER NOT NULL,
+            recorded BLOB NOT NULL,
+            present BLOB NOT NULL,
+            PRIMARY KEY (term_start, student_id),
+            FOREIGN KEY (student_id) REFERENCES students (id)
+        ) WITHOUT ROWID
+    ''')
+    # The guard triggers are created by the first compaction, so uncompacted databases pay nothing
+
+def _rebuild_table(conn, name, create_sql, select_sql):
+    """Replace a table with one created by create_sql ({name} placeholder) and filled by select_sql."""
+    conn.execute(create_sql.format(name=f'{name}_new'))
+    conn.execute(f'INSERT INTO {name}_new {select_sql}')
+    conn.execute(f'DROP TABLE {name}')
+    conn.execute(f'ALTER TABLE {name}_new RENAME TO {name}')
+
+# SQL expressions encoding the version 4 TEXT columns; NULL when a value cannot be encoded
+# julianday() rather than unixepoch(), which needs SQLite 3.38
+_DAY_SQL = 'CAST(julianday({}) - 2440587.5 AS INTEGER)'
+_STATUS_SQL = "CASE lower(trim({})) WHEN 'present' THEN 1 WHEN 'absent' THEN 2 END"
+
+def _encode_attendance(conn):
+    """Version 5: dates as day numbers since 1970-01-01 and statuses as codes (1 Present, 2 Absent)."""
+    day, status = _DAY_SQL.format('date'), _STATUS_SQL.format('status')
+    # Rows that cannot be encoded are set aside for review rather than dropped
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS attendance_rejected (
+            id INTEGER PRIMARY KEY,
+            student_id INTEGER,
+            date TEXT,
+            status TEXT
+        )
+    ''')
+    conn.execute(f'''
+        INSERT INTO attendance_rejected (id, student_id, date, status)
+        SELECT id, student_id, date, status FROM attendance WHERE {day} IS NULL OR {status} IS NULL
+    ''')
+    sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'attendance'").fetchone()
+    _rebuild_table(conn, 'attendance', '''
+        CREATE TABLE {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER NOT NULL,
+            date INTEGER NOT NULL,
+            status INTEGER NOT NULL CHECK (status IN (1, 2)),
+            FOREIGN KEY (student_id) REFERENCES students (id)
+        )
+    ''', f'''
+        SELECT id, student_id, {day}, {status} FROM attendance
+        WHERE {day} IS NOT NULL AND {status} IS NOT NULL
+    ''')
+    if sequence is not None:
+        # Keep ids of deleted rows from being handed out again
+        conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'attendance'", sequence)
+    create_attendance_indexes(conn)
+
+    # The count tables already include compacted terms, so convert them rather than rebuild
+    _rebuild_table(conn, 'attendance_daily_counts', '''
+        CREATE TABLE {name} (
+            date INTEGER NOT NULL,
+            status INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (date, status)
+        ) WITHOUT ROWID
+    ''', f'''
+        SELECT {day}, {status}, SUM(count) FROM attendance_daily_counts
+        WHERE {day} IS NOT NULL AND {status} IS NOT NULL
+        GROUP BY 1, 2
+    ''')
+    _rebuild_table(conn, 'attendance_student_counts', '''
+        CREATE TABLE {name} (
+            student_id INTEGER NOT NULL,
+            status INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (student_id, status)
+        ) WITHOUT ROWID
+    ''', f'''
+        SELECT student_id, {status}, SUM(count) FROM attendance_student_counts
+        WHERE {status} IS NOT NULL
+        GROUP BY 1, 2
+    ''')
+
+    _rebuild_table(conn, 'attendance_terms', '''
+        CREATE TABLE {name} (
+            start_date INTEGER PRIMARY KEY,
+            end_date INTEGER NOT NULL
+        ) WITHOUT ROWID
+    ''', f"SELECT {_DAY_SQL.format('start_date')}, {_DAY_SQL.format('end_date')} FROM attendance_terms")
+    _rebuild_table(conn, 'attendance_bitsets', '''
+        CREATE TABLE {name} (
+            term_start INTEGER NOT NULL,
+            student_id INTEGER NOT NULL,
+            recorded BLOB NOT NULL,
+            present BLOB NOT NULL,
+            PRIMARY KEY (term_start, student_id),
+            FOREIGN KEY (student_id) REFERENCES students (id)
+        ) WITHOUT ROWID
+    ''', f"SELECT {_DAY_SQL.format('term_start')}, student_id, recorded, present FROM attendance_bitsets")
+    # Dropping the old attendance table took its triggers with it
+    create_attendance_count_triggers(conn)
+    if conn.execute('SELECT COUNT(*) FROM attendance_terms').fetchone()[0]:
+        create_attendance_term_triggers(conn)
+
+ATTENDANCE_PARTITION_TRIGGERS = ('attendance_partitions_insert', 'attendance_partitions_update')
+
+def create_attendance_partition_triggers(conn):
+    """Reject attendance rows dated inside an archived partition; its rows live in the partition file."""
+    guard = '''
+        WHEN EXISTS (SELECT 1 FROM attendance_partitions WHERE NEW.date BETWEEN start_date AND end_date)
+        BEGIN SELECT RAISE(ABORT, 'attendance for an archived partition is read-only'); END
+    '''
+    conn.execute(f'CREATE TRIGGER IF NOT EXISTS attendance_partitions_insert BEFORE INSERT ON attendance {guard}')
+    conn.execute(f'CREATE TRIGGER IF NOT EXISTS attendance_partitions_update BEFORE UPDATE OF date ON attendance {guard}')
+
+def drop_attendance_partition_triggers(conn):
+    """Drop the archived partition guards, once no partitions remain."""
+    for name in ATTENDANCE_PARTITION_TRIGGERS:
+        conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+
+def create_partition_schema(conn):
+    """Create the attendance table of a partition file; it keeps the ids the rows had in the main file."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS attendance (
+            id INTEGER PRIMARY KEY,
+            student_id INTEGER NOT NULL,
+            date INTEGER NOT NULL,
+            status INTEGER NOT NULL CHECK (status IN (1, 2))
+        )
+    ''')
+
+def _add_attendance_partitions(conn):
+    """Version 6: date ranges of attendance moved out into their own read-only database files."""
+    # file is relative to the directory of the main database; a partition is rewritten under a
+    # new name rather than changed in place, so readers can open it with immutable=1
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS attendance_partitions (
+            start_date INTEGER PRIMARY KEY,
+            end_date INTEGER NOT NULL,
+            file TEXT NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    # The guard triggers are created by the first archive, like the compacted term guards
+
+def _cascade_student_deletes(conn):
+    """Version 7: deleting a student deletes their attendance rows, with foreign keys enforced."""
+    # Rows whose student no longer exists would violate the enforced key; set them aside for review.
+    # Deleting them while the count triggers are still in place takes them out of the counts.
+    orphans = 'student_id NOT IN (SELECT id FROM students)'
+    conn.execute(f'''
+        INSERT INTO attendance_rejected (id, student_id, date, status)
+        SELECT id, student_id, date(date * 86400, 'unixepoch'), CASE status WHEN 1 THEN 'Present' ELSE 'Absent' END
+        FROM attendance WHERE {orphans}
+    ''')
+    conn.execute(f'DELETE FROM attendance WHERE {orphans}')
+    sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'attendance'").fetchone()
+    _rebuild_table(conn, 'attendance', '''
+        CREATE TABLE {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INTEGER NOT NULL,
+            date INTEGER NOT NULL,
+            status INTEGER NOT NULL CHECK (status IN (1, 2)),
+            FOREIGN KEY (student_id) REFERENCES students (id) ON DELETE CASCADE
+        )
+    ''', 'SELECT id, student_id, date, status FROM attendance')
+    if sequence is not None:
+        conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'attendance'", sequence)
+    create_attendance_indexes(conn)
+    # Dropping the old attendance table took its triggers with it; the cascade fires the count
+    # triggers, so deleted students' rows leave the count tables as well
+    create_attendance_count_triggers(conn)
+    if conn.execute('SELECT COUNT(*) FROM attendance_terms').fetchone()[0]:
+        create_attendance_term_triggers(conn)
+    if conn.execute('SELECT COUNT(*) FROM attendance_partitions').fetchone()[0]:
+        create_attendance_partition_triggers(conn)
+    # attendance_bitsets keeps its plain key: a compacted student's history must come out of the
+    # count tables by hand first (see student_records.delete_students), and the enforced key
+    # rejects a delete that skips that step
+
+# Ordered list of (version, migration); append new entries, never edit old ones
+MIGRATIONS = [
+    (1, _create_base_tables),
+    (2, _index_attendance),
+    (3, _add_attendance_counts),
+    (4, _add_attendance_bitsets),
+    (5, _encode_attendance),
+    (6, _add_attendance_partitions),
+    (7, _cascade_student_deletes),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def get_version(conn):
+    """Return the schema version recorded in PRAGMA user_version."""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def migrate(conn):
+    """Apply every pending migration, each in its own transaction; returns the schema version."""
+    if get_version(conn) >= SCHEMA_VERSION:
+        # Already current: no DDL and no write lock
+        return get_version(conn)
+    # Table rebuilds copy rows before their parents' keys are checked, and older databases may hold
+    # rows the enforced keys would reject; the pragma can only change outside a transaction
+    conn.execute('PRAGMA foreign_keys = OFF')
+    try:
+        for version, migration in MIGRATIONS:
+            if version <= get_version(conn):
+                continue
+            with db.transaction(conn):
+                # Re-check under the write lock in case another process got here first
+                if version <= get_version(conn):
+                    continue
+                migration(conn)
+                conn.execute(f'PRAGMA user_version = {version}')
+    finally:
+        conn.execute('PRAGMA foreign_keys = ON')
+    return get_version(conn)
@@ -0,0 +1,158 @@
+import atexit
+import functools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Calls slower than this have the query plans of their statements recorded
+SLOW_THRESHOLD_MS = float(os.environ.get('STUDENT_RECORDS_SLOW_MS', '100'))
+
+# Statements captured per call, and slow calls kept
+MAX_STATEMENTS = 20
+MAX_SLOW_CALLS = 100
+
+_enabled = os.environ.get('STUDENT_RECORDS_PROFILE', '') not in ('', '0')
+_lock = threading.Lock()
+_stats = {}
+_slow = deque(maxlen=MAX_SLOW_CALLS)
+_local = threading.local()
+
+def enabled():
+    return _enabled
+
+def enable():
+    global _enabled
+    _enabled = True
+
+def disable():
+    global _enabled
+    _enabled = False
+
+def reset():
+    """Forget all recorded statistics."""
+    with _lock:
+        _stats.clear()
+        _slow.clear()
+
+@contextmanager
+def profiling():
+    """Enable profiling for the duration of a with block."""
+    previous = _enabled
+    enable()
+    try:
+        yield
+    finally:
+        if not previous:
+            disable()
+
+def _explain(conn, statements):
+    plans = []
+    for sql in statements:
+        if sql.lstrip().split(None, 1)[0].upper() not in ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE'):
+            continue
+        try:
+            plan = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}')]
+        except Exception as e:
+            plan = [f'unavailable: {e}']
+        plans.append({'sql': ' '.join(sql.split()), 'plan': plan})
+    return plans
+
+def _record(name, seconds, result, statements, get_connection):
+    rows = len(result) if isinstance(result, (list, dict)) else 0
+    slow = seconds * 1000 >= SLOW_THRESHOLD_MS
+    # EXPLAIN runs outside the lock; it can take a moment on a large schema
+    plans = _explain(get_connection(), statements) if slow and get_connection is not None else None
+    with _lock:
+        entry = _stats.setdefault(name, {'calls': 0, 'total_s': 0.0, 'max_s': 0.0, 'rows': 0})
+        entry['calls'] += 1
+        entry['total_s'] += seconds
+        entry['max_s'] = max(entry['max_s'], seconds)
+        entry['rows'] += rows
+        if slow:
+            _slow.append({'function': name, 'ms': round(seconds * 1000, 3), 'time': time.time(),
+                          'statements': plans or []})
+
+def _trace(sql):
+    # Each profiled call still running on this thread sees the statement
+    for statements in _local.stack:
+        if len(statements) < MAX_STATEMENTS and sql not in statements:
+            statements.append(sql)
+
+def instrument(func, get_connection):
+    """Wrap func so that, while profiling is enabled, its calls, time, rows and slow plans are recorded."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return func(*args, **kwargs)
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        conn = None
+        if not stack:
+            # The outermost profiled call installs the trace callback for the whole call tree
+            try:
+                conn = get_connection()
+                conn.set_trace_callback(_trace)
+            except Exception:
+                conn = None
+        statements = []
+        stack.append(statements)
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            stack.pop()
+            if conn is not None:
+                conn.set_trace_callback(None)
+        _record(func.__name__, seconds, result, statements, get_connection if statements else None)
+        return result
+    return wrapper
+
+def instrument_module(namespace, get_connection, exclude=()):
+    """Instrument every public function defined in a module namespace (pass globals())."""
+    module = namespace['__name__']
+    for name, value in list(namespace.items()):
+        if name.startswith('_') or name in exclude or isinstance(value, type) or not callable(value):
+            continue
+        if getattr(value, '__module__', None) == module:
+            namespace[name] = instrument(value, get_connection)
+
+def stats():
+    """Aggregated statistics per function, slowest total time first."""
+    with _lock:
+        rows = [{'function': name, 'calls': s['calls'], 'total_ms': round(s['total_s'] * 1000, 3),
+                 'mean_ms': round(s['total_s'] / s['calls'] * 1000, 3), 'max_ms': round(s['max_s'] * 1000, 3),
+                 'rows': s['rows']}
+                for name, s in _stats.items()]
+    return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+
+def slow_calls():
+    """Recorded calls over SLOW_THRESHOLD_MS with their statements' query plans, newest last."""
+    with _lock:
+        return list(_slow)
+
+def report():
+    """Plain-text table of stats() followed by the slow calls."""
+    lines = [f"{'function':<36} {'calls':>7} {'total ms':>11} {'mean ms':>9} {'max ms':>9} {'rows':>9}"]
+    for row in stats():
+        lines.append(f"{row['function']:<36} {row['calls']:>7} {row['total_ms']:>11.1f} {row['mean_ms']:>9.2f} "
+                     f"{row['max_ms']:>9.2f} {row['rows']:>9}")
+    for call in slow_calls():
+        lines.append(f"\nSLOW {call['function']} {call['ms']:.1f} ms")
+        for statement in call['statements']:
+            lines.append(f"  {statement['sql'][:200]}")
+            lines.extend(f"    {step}" for step in statement['plan'])
+    return '\n'.join(lines)
+
+def dump(path):
+    """Write stats() and slow_calls() to a JSON file."""
+    import json
+
+    with open(path, 'w') as f:
+        json.dump({'stats': stats(), 'slow_calls': slow_calls()}, f, indent=2)
+
+if os.environ.get('STUDENT_RECORDS_PROFILE_OUTPUT'):
+    atexit.register(lambda: dump(os.environ['STUDENT_RECORDS_PROFILE_OUTPUT']))
@@ -0,0 +1,97 @@
+import argparse
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import db
+import student_records
+
+# Student ids handled by one chunk of a report
+CHUNK_STUDENTS = 1000
+
+def _read_only_connection(path):
+    """A private read-only connection for one chunk; it never takes a write lock."""
+    return db.connect(f'file:{os.path.abspath(path)}?mode=ro')
+
+def _use_database(path):
+    # A worker process starts with the default DB_FILE; partition files are found next to it
+    if student_records.DB_FILE != path:
+        student_records.DB_FILE = path
+
+def _rate_counts(path, first_id, last_id, first_day, last_day):
+    """Worker: {student_id: (present, absent)} over a range of days for one range of student ids."""
+    _use_database(path)
+    conn = _read_only_connection(path)
+    try:
+        return student_records._student_status_counts(conn, first_day, last_day, first_id=first_id, last_id=last_id)
+    finally:
+        conn.close()
+
+def _run(worker, chunks, workers, processes):
+    """worker(DB_FILE, *chunk) for every chunk, in order, spread over a thread or process pool.
+
+    Threads suit most reports: sqlite3 releases the GIL while SQLite scans and aggregates, and
+    only each chunk's result is built in Python. Processes avoid the GIL entirely, at the cost
+    of starting interpreters and pickling results back.
+    """
+    path = student_records.DB_FILE
+    workers = min(workers or os.cpu_count() or 1, len(chunks))
+    if workers <= 1:
+        return [worker(path, *chunk) for chunk in chunks]
+    pool = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with pool(max_workers=workers) as executor:
+        return list(executor.map(worker, [path] * len(chunks), *zip(*chunks)))
+
+def _split(first, last, size):
+    """Cover first..last inclusive with (start, end) chunks of at most size values."""
+    return [(start, min(start + size - 1, last)) for start in range(first, last + 1, size)]
+
+def _student_chunks(chunk_students, *args):
+    """(first id, last id, *args) chunks covering every student id, or [] without students."""
+    first_id, last_id = student_records.get_connection().execute('SELECT MIN(id), MAX(id) FROM students').fetchone()
+    if first_id is None:
+        return []
+    return [(start, end, *args) for start, end in _split(first_id, last_id, chunk_students)]
+
+@student_records.cached_read
+def attendance_rates(start_date, end_date, workers=None, processes=False, chunk_students=CHUNK_STUDENTS):
+    """get_attendance_rates, aggregated in parallel chunks of chunk_students student ids.
+
+    Each chunk is counted over the whole date range on its own read-only connection, walking
+    the (student_id, date) index in group order, so the chunks' counts never overlap. Chunks may
+    see slightly different snapshots if writes land mid-report.
+    """
+    first, last = student_records.to_day(start_date), student_records.to_day(end_date)
+    conn = student_records.get_connection()
+    # A range over the whole history is answered from the per-student count table, with nothing to split
+    counts = student_records._student_totals(conn, first, last)
+    if counts is None:
+        counts = {}
+        for partial in _run(_rate_counts, _student_chunks(chunk_students, first, last), workers, processes):
+            counts.update(partial)
+    students = conn.execute('SELECT id, name FROM students ORDER BY id').fetchall()
+    return student_records._attendance_rate_columns(
+        student_records._attendance_rate_rows(students, counts, last - first + 1))
+
+def main(argv):
+    """Command-line entry point: report START END [--workers N] [--processes] [--output FILE.csv]."""
+    parser = argparse.ArgumentParser(prog='student_records.py report')
+    parser.add_argument('start', type=student_records._date_argument, help='first date (YYYY-MM-DD)')
+    parser.add_argument('end', type=student_records._date_argument, help='last date (YYYY-MM-DD)')
+    parser.add_argument('--workers', type=int, help='parallel chunks (default: one per CPU)')
+    parser.add_argument('--processes', action='store_true', help='run chunks in processes rather than threads')
+    parser.add_argument('--output', help='write per-student rates to this CSV file')
+    args = parser.parse_args(argv)
+
+    rates = attendance_rates(args.start, args.end, args.workers, args.processes)
+    for status, count in student_records.get_attendance_summary_by_date_range(args.start, args.end):
+        print(f"{status:8} {count:12,}")
+    if rates['rate']:
+        print(f"{len(rates['rate'])} students, average attendance rate "
+              f"{sum(rates['rate']) / len(rates['rate']):.1f}% from {args.start} to {args.end}.")
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(list(rates))
+            writer.writerows(zip(*rates.values()))
+        print(f"Wrote {len(rates['student_id'])} rows to {args.output}.")
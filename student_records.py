@@ -1,220 +1,1345 @@
 import sqlite3
 import os
-from datetime import datetime
+import math
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
 
-# Database file
-DB_FILE = 'student_records.db'
+import cache
+import db
+import migrations
+import profiler
+
+# Database file; scripts can point the CLI elsewhere with STUDENT_RECORDS_DB
+DB_FILE = os.environ.get('STUDENT_RECORDS_DB', 'student_records.db')
+
+# Status categories used by the attendance grid; code 0 means no record for that day
+STATUS_CATEGORIES = ['Not Recorded', 'Present', 'Absent']
+
+# Attendance stores dates as day numbers (days since 1970-01-01) and statuses as their
+# STATUS_CATEGORIES code; the API keeps ISO date strings and status names, converted below
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+MIN_DAY = date.min.toordinal() - EPOCH_ORDINAL
+MAX_DAY = date.max.toordinal() - EPOCH_ORDINAL
+STATUS_CODES = {'Present': 1, 'Absent': 2}
+# Case-folded names, matched after trimming as the version 5 migration does
+_FOLDED_STATUS_CODES = {name.casefold(): code for name, code in STATUS_CODES.items()}
+
+def to_day(value):
+    """Day number of an ISO date string or date; None stays None."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = date.fromisoformat(value)
+    return value.toordinal() - EPOCH_ORDINAL
+
+class _DateNames(dict):
+    """day number -> ISO date string, filled on first use; a plain dict lookup after that."""
+
+    def __missing__(self, day):
+        name = self[day] = None if day is None else date.fromordinal(day + EPOCH_ORDINAL).isoformat()
+        return name
+
+_date_names = _DateNames()
+
+def to_date(day):
+    """ISO date string of a day number; None stays None."""
+    return _date_names[day]
+
+def to_status_code(status):
+    """Stored code of a status name, ignoring case and surrounding spaces; raises ValueError otherwise."""
+    try:
+        return STATUS_CODES[status]
+    except (KeyError, TypeError):
+        pass
+    try:
+        return _FOLDED_STATUS_CODES[status.strip().casefold()]
+    except (KeyError, AttributeError):
+        raise ValueError(f"invalid status {status!r}; expected Present or Absent") from None
+
+# Status code -> name, with None for the missing side of a LEFT JOIN
+_status_names = {None: None, **dict(enumerate(STATUS_CATEGORIES))}
+
+def _records(rows):
+    """Convert (id, student_id, date, status) attendance rows to the string API."""
+    names, statuses = _date_names, _status_names
+    return [(id_, student_id, names[day], statuses[status]) for id_, student_id, day, status in rows]
+
+def _joined_records(rows):
+    """Convert (student id, name, grade, date, status) rows; date and status are None without attendance."""
+    names, statuses = _date_names, _status_names
+    return [(student_id, name, grade, names[day], statuses[status])
+            for student_id, name, grade, day, status in rows]
+
+def get_connection():
+    """Return the pooled connection to DB_FILE for the current thread."""
+    return db.get_connection(DB_FILE)
+
+def _db_file():
+    return DB_FILE
+
+# Read functions are memoized until the next write; see cache.py
+cached_read = cache.cached(_db_file)
 
 def create_tables():
-    """Create the students and attendance tables if they don't exist."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-
-    # Students table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS students (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            grade REAL
-        )
-    ''')
-
-    # Attendance table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS attendance (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            student_id INTEGER NOT NULL,
-            date TEXT NOT NULL,
-            status TEXT NOT NULL,
-            FOREIGN KEY (student_id) REFERENCES students (id)
-        )
-    ''')
+    """Create or upgrade the database schema to the latest version.
 
-    conn.commit()
-    conn.close()
+    Costs one PRAGMA read when the schema is already current, so every CLI call and app rerun
+    can make it without writing or dropping cached reads.
+    """
+    conn = get_connection()
+    if migrations.get_version(conn) != migrations.SCHEMA_VERSION:
+        migrations.migrate(conn)
+        cache.invalidate()
 
+@cache.invalidates
 def add_student(name, grade):
-    """Add a new student."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('INSERT INTO students (name, grade) VALUES (?, ?)', (name, grade))
-    conn.commit()
-    conn.close()
+    """Add a new student; returns their id."""
+    return get_connection().execute('INSERT INTO students (name, grade) VALUES (?, ?)', (name, grade)).lastrowid
 
+@cached_read
 def get_students():
     """Retrieve all students."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM students')
-    students = cursor.fetchall()
-    conn.close()
-    return students
+    return get_connection().execute('SELECT * FROM students').fetchall()
 
+@cache.invalidates
 def update_student(student_id, name=None, grade=None):
     """Update a student's information."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
+    conn = get_connection()
     if name and grade:
-        cursor.execute('UPDATE students SET name = ?, grade = ? WHERE id = ?', (name, grade, student_id))
+        conn.execute('UPDATE students SET name = ?, grade = ? WHERE id = ?', (name, grade, student_id))
     elif name:
-        cursor.execute('UPDATE students SET name = ? WHERE id = ?', (name, student_id))
+        conn.execute('UPDATE students SET name = ? WHERE id = ?', (name, student_id))
     elif grade:
-        cursor.execute('UPDATE students SET grade = ? WHERE id = ?', (grade, student_id))
-    conn.commit()
-    conn.close()
+        conn.execute('UPDATE students SET grade = ? WHERE id = ?', (grade, student_id))
 
+@cache.invalidates
 def delete_student(student_id):
     """Delete a student and their attendance records."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM attendance WHERE student_id = ?', (student_id,))
-    cursor.execute('DELETE FROM students WHERE id = ?', (student_id,))
-    conn.commit()
-    conn.close()
+    delete_students([student_id])
+
+@cache.invalidates
+def add_students(students):
+    """Add (name, grade) pairs in one transaction; returns the number of students added."""
+    conn = get_connection()
+    with db.transaction(conn):
+        return conn.executemany('INSERT INTO students (name, grade) VALUES (?, ?)', students).rowcount
+
+@cache.invalidates
+def update_students(updates):
+    """Apply (student_id, name, grade) updates in one transaction; None keeps a field as it is.
+
+    Returns the number of students changed; rows that already match are not rewritten.
+    """
+    conn = get_connection()
+    with db.transaction(conn):
+        return conn.executemany('''
+            UPDATE students SET name = COALESCE(?2, name), grade = COALESCE(?3, grade)
+            WHERE id = ?1 AND (name IS NOT COALESCE(?2, name) OR grade IS NOT COALESCE(?3, grade))
+        ''', updates).rowcount
+
+@cache.invalidates
+def delete_students(student_ids):
+    """Delete students and all their attendance in one transaction; returns the number deleted.
+
+    Live attendance rows follow each student through ON DELETE CASCADE, and the count triggers
+    take them out of the count tables. Compacted and archived history sits outside the foreign
+    key, so it is removed first.
+    """
+    conn = get_connection()
+    with _partition_rewrite(conn) as rewritten:
+        return _delete_students(conn, student_ids, rewritten)
 
+def _delete_students(conn, student_ids, rewritten):
+    """Body of delete_students, run inside the caller's _partition_rewrite(), which passes rewritten."""
+    student_ids = sorted({int(sid) for sid in student_ids})
+    if not student_ids:
+        return 0
+    ids = _student_ids_param(student_ids)
+    _delete_compacted_students(conn, student_ids)
+    _delete_partitioned_students(conn, student_ids, rewritten)
+    if len(student_ids) == 1:
+        deleted = conn.execute('DELETE FROM students WHERE id = ?', student_ids).rowcount
+    else:
+        # Take a class's live rows out of the daily counts in one pass rather than running
+        # the count triggers once for every cascaded row
+        decrements = conn.execute('''
+            SELECT COUNT(*), date, status FROM attendance
+            WHERE student_id IN (SELECT value FROM json_each(?))
+            GROUP BY date, status
+        ''', (ids,)).fetchall()
+        migrations.drop_attendance_count_triggers(conn)
+        deleted = conn.executemany('DELETE FROM students WHERE id = ?', [(sid,) for sid in student_ids]).rowcount
+        migrations.create_attendance_count_triggers(conn)
+        conn.executemany('UPDATE attendance_daily_counts SET count = count - ? WHERE date = ? AND status = ?',
+                         decrements)
+        conn.execute('DELETE FROM attendance_daily_counts WHERE count <= 0')
+    conn.execute('DELETE FROM attendance_student_counts WHERE student_id IN (SELECT value FROM json_each(?))',
+                 (ids,))
+    return deleted
+
+def diff_student_frames(original, edited):
+    """Compare a students frame (ID, Name and Grade columns) with its copy edited in a data editor.
+
+    Returns (added, updated, deleted): (name, grade) for new rows, which have no ID, and are
+    skipped without a name; (student_id, name, grade) for changed rows, with None for a blanked
+    name or grade, which update_students keeps as it is, so rows whose only change is a blanked
+    cell are left out; and the ids of removed rows.
+    """
+    import pandas as pd
+
+    def value(x):
+        # Blank cells come back as None, NaN or an empty string
+        if isinstance(x, str):
+            return x.strip() or None
+        return None if pd.isna(x) else x
+
+    kept = edited[edited['ID'].notna()].astype({'ID': 'int64'})
+    new = edited[edited['ID'].isna()]
+    added = [(value(name), value(grade)) for name, grade in zip(new['Name'], new['Grade']) if value(name)]
+    merged = original.merge(kept, on='ID', suffixes=('', '_new'))
+    updated = []
+    for student_id, old_name, old_grade, name, grade in merged[
+            ['ID', 'Name', 'Grade', 'Name_new', 'Grade_new']].itertuples(index=False):
+        name, grade = value(name), value(grade)
+        if (name is not None and name != value(old_name)) or (grade is not None and grade != value(old_grade)):
+            updated.append((int(student_id), name, grade))
+    deleted = sorted(set(original['ID'].tolist()) - set(kept['ID'].tolist()))
+    return added, updated, deleted
+
+@cache.invalidates
+def apply_student_changes(added, updated, deleted):
+    """Apply a change set from diff_student_frames in one transaction; returns (added, updated, deleted)."""
+    conn = get_connection()
+    with _partition_rewrite(conn) as rewritten:
+        return add_students(added), update_students(updated), _delete_students(conn, deleted, rewritten)
+
+@cache.invalidates
 def add_attendance(student_id, date, status):
-    """Add attendance record."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('INSERT INTO attendance (student_id, date, status) VALUES (?, ?, ?)', (student_id, date, status))
-    conn.commit()
-    conn.close()
+    """Add attendance record, replacing any existing status for that student and date."""
+    get_connection().execute('''
+        INSERT INTO attendance (student_id, date, status) VALUES (?, ?, ?)
+        ON CONFLICT (student_id, date) DO UPDATE SET status = excluded.status
+    ''', (student_id, to_day(date), to_status_code(status)))
 
+@cached_read
 def get_attendance():
-    """Retrieve all attendance records."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM attendance')
-    attendance = cursor.fetchall()
-    conn.close()
-    return attendance
+    """Retrieve all attendance records in (date, student id) order; compacted records have an id of None."""
+    return [record for rows in _iter_attendance_rows(get_connection(), MIN_DAY, MAX_DAY) for record in _records(rows)]
 
+@cache.invalidates
 def update_attendance(attendance_id, status):
     """Update attendance status."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('UPDATE attendance SET status = ? WHERE id = ?', (status, attendance_id))
-    conn.commit()
-    conn.close()
+    get_connection().execute('UPDATE attendance SET status = ? WHERE id = ?', (to_status_code(status), attendance_id))
 
+@cache.invalidates
 def delete_attendance(attendance_id):
     """Delete an attendance record."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM attendance WHERE id = ?', (attendance_id,))
-    conn.commit()
-    conn.close()
+    get_connection().execute('DELETE FROM attendance WHERE id = ?', (attendance_id,))
 
+@cached_read
 def get_students_with_attendance():
     """JOIN query: Get students with their attendance records."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT s.id, s.name, s.grade, a.date, a.status
-        FROM students s
-        LEFT JOIN attendance a ON s.id = a.student_id
-        ORDER BY s.id, a.date
-    ''')
-    results = cursor.fetchall()
-    conn.close()
-    return results
+    conn = get_connection()
+    return [record for rows in _iter_joined_rows(conn, MIN_DAY, MAX_DAY) for record in _joined_records(rows)]
+
+# Default number of rows returned by the *_page functions
+PAGE_SIZE = 100
+
+# Rows fetched per round trip by the iter_* generators
+BATCH_SIZE = 500
+
+def _day_range(start_date, end_date):
+    """Day numbers of an optional date range; a missing start or end leaves that side open."""
+    return (MIN_DAY if start_date is None else to_day(start_date), MAX_DAY if end_date is None else to_day(end_date))
+
+def _fetch_batches(conn, sql, params, batch_size):
+    """Yield the rows of a query as fetchmany batches."""
+    cursor = conn.execute(sql, params)
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield rows
+
+def _iter_rows(sql, params=(), batch_size=BATCH_SIZE):
+    """Yield the rows of a query in fetchmany batches on a connection that lives as long as the generator."""
+    conn = db.connect(DB_FILE)
+    try:
+        for rows in _fetch_batches(conn, sql, params, batch_size):
+            yield from rows
+    finally:
+        conn.close()
+
+def _iter_attendance_rows(conn, first_day, last_day, student_ids=None, batch_size=BATCH_SIZE):
+    """Yield stored (id, student_id, day, code) attendance rows in (date, student_id) order, in batches.
+
+    Live rows, archived partitions and compacted terms (whose rows have an id of None) never
+    share a date, so the range is walked in date order, reading each stretch from where it is
+    kept. student_ids limits the rows to those students.
+    """
+    ids = _student_ids_param(student_ids)
+    wanted = None if student_ids is None else {int(sid) for sid in student_ids}
+    sql = '''
+        SELECT id, student_id, date, status FROM attendance
+        WHERE date BETWEEN :first AND :last
+          AND (:ids IS NULL OR student_id IN (SELECT value FROM json_each(:ids)))
+        ORDER BY date, student_id
+    '''
+    # None marks a compacted term
+    history = sorted([*_partitions(conn, first_day, last_day),
+                      *((start, end, None) for start, end in _compacted_terms(conn, first_day, last_day))])
+    day = first_day
+    for start, end, file in history:
+        if day < start:
+            yield from _fetch_batches(conn, sql, {'first': day, 'last': start - 1, 'ids': ids}, batch_size)
+        first, last = max(start, first_day), min(end, last_day)
+        if file is None:
+            # A day at a time, which comes out in student order and bounds the memory a term needs
+            bounds = (None, None) if wanted is None else (min(wanted, default=0), max(wanted, default=-1))
+            for term_day in range(first, last + 1):
+                for term_ids, days, codes in _iter_compacted(conn, term_day, term_day, *bounds):
+                    rows = [(None, sid, d, code) for sid, d, code in _compacted_records(term_ids, days, codes, False)
+                            if wanted is None or sid in wanted]
+                    for offset in range(0, len(rows), batch_size):
+                        yield rows[offset:offset + batch_size]
+        else:
+            source = _open_partition(file)
+            try:
+                yield from _fetch_batches(source, sql, {'first': first, 'last': last, 'ids': ids}, batch_size)
+            finally:
+                source.close()
+        day = end + 1
+    if day <= last_day:
+        yield from _fetch_batches(conn, sql, {'first': day, 'last': last_day, 'ids': ids}, batch_size)
+
+def _joined_rows(conn, students, first_day, last_day):
+    """Stored (student id, name, grade, day, code) JOIN rows of (id, name, grade) students in id order.
+
+    Attendance comes from live rows, archived partitions and compacted terms; a student without
+    any in the range gets one row with day and code None, as with a LEFT JOIN.
+    """
+    if not students:
+        return []
+    first_id, last_id = students[0][0], students[-1][0]
+    attendance = {}
+    for schema in _attendance_schemas(conn, first_day, last_day):
+        # +date keeps the planner on idx_attendance_student_date; the date index would scan the whole range
+        for student_id, day, status in conn.execute(f'''
+            SELECT student_id, date, status FROM {schema}.attendance
+            WHERE student_id BETWEEN ? AND ? AND +date BETWEEN ? AND ?
+        ''', (first_id, last_id, first_day, last_day)):
+            attendance.setdefault(student_id, []).append((day, status))
+    for student_ids, days, codes in _iter_compacted(conn, first_day, last_day, first_id, last_id):
+        for student_id, day, status in _compacted_records(student_ids, days, codes, decode=False):
+            attendance.setdefault(student_id, []).append((day, status))
+    rows = []
+    for student in students:
+        records = attendance.get(student[0])
+        if records is None:
+            rows.append((*student, None, None))
+        else:
+            records.sort()
+            rows.extend((*student, day, status) for day, status in records)
+    return rows
+
+def _iter_joined_rows(conn, first_day, last_day, student_ids=None, batch_size=BATCH_SIZE):
+    """Yield the _joined_rows of all students (or of student_ids) in batches of batch_size students."""
+    ids = _student_ids_param(student_ids)
+    after_id = 0
+    while True:
+        students = conn.execute('''
+            SELECT id, name, grade FROM students
+            WHERE id > :after AND (:ids IS NULL OR id IN (SELECT value FROM json_each(:ids)))
+            ORDER BY id
+            LIMIT :limit
+        ''', {'after': after_id, 'ids': ids, 'limit': batch_size}).fetchall()
+        if not students:
+            return
+        yield _joined_rows(conn, students, first_day, last_day)
+        after_id = students[-1][0]
 
+def iter_students(batch_size=BATCH_SIZE):
+    """Stream all students."""
+    return _iter_rows('SELECT * FROM students ORDER BY id', batch_size=batch_size)
+
+def iter_attendance(start_date=None, end_date=None, batch_size=BATCH_SIZE):
+    """Stream attendance records in (date, student id) order, optionally limited to a date range.
+
+    Compacted records have an id of None.
+    """
+    conn = db.connect(DB_FILE)
+    try:
+        for rows in _iter_attendance_rows(conn, *_day_range(start_date, end_date), batch_size=batch_size):
+            yield from _records(rows)
+    finally:
+        conn.close()
+
+def iter_students_with_attendance(batch_size=BATCH_SIZE):
+    """Stream the students/attendance JOIN in (student id, date) order, batch_size students at a time."""
+    conn = db.connect(DB_FILE)
+    try:
+        for rows in _iter_joined_rows(conn, MIN_DAY, MAX_DAY, batch_size=batch_size):
+            yield from _joined_records(rows)
+    finally:
+        conn.close()
+
+@cached_read
+def get_students_page(after_id=0, limit=PAGE_SIZE, name=None):
+    """Keyset page of students with id > after_id, optionally filtered by a name substring."""
+    return get_connection().execute('''
+        SELECT * FROM students
+        WHERE id > :after AND (:name IS NULL OR name LIKE '%' || :name || '%')
+        ORDER BY id
+        LIMIT :limit
+    ''', {'after': after_id, 'limit': limit, 'name': name}).fetchall()
+
+@cached_read
+def get_attendance_page(after_id=0, limit=PAGE_SIZE, student_id=None, start_date=None, end_date=None):
+    """Keyset page of attendance records with id > after_id, with optional student and date filters."""
+    return _records(get_connection().execute('''
+        SELECT * FROM attendance
+        WHERE id > :after
+          AND (:student_id IS NULL OR student_id = :student_id)
+          AND (:start IS NULL OR date >= :start)
+          AND (:end IS NULL OR date <= :end)
+        ORDER BY id
+        LIMIT :limit
+    ''', {'after': after_id, 'limit': limit, 'student_id': student_id,
+          'start': to_day(start_date), 'end': to_day(end_date)}))
+
+@cached_read
+def get_students_with_attendance_page(after=None, limit=PAGE_SIZE, start_date=None, end_date=None):
+    """Keyset page of the students/attendance JOIN ordered by (student id, date).
+
+    after is the (student_id, date) of the last row of the previous page; the date of a
+    student without attendance is None.
+    """
+    after_id, after_date = after if after is not None else (0, None)
+    first_day, last_day = _day_range(start_date, end_date)
+    conn = get_connection()
+    # A student without attendance sorts as MIN_DAY - 1, before any real date
+    none = MIN_DAY - 1
+    after_key = (after_id, none if after_date is None else to_day(after_date))
+    rows = []
+    next_id, students_wanted = after_id, 1
+    while len(rows) < limit:
+        students = conn.execute('SELECT id, name, grade FROM students WHERE id >= ? ORDER BY id LIMIT ?',
+                                (next_id, students_wanted)).fetchall()
+        if not students:
+            break
+        rows.extend(row for row in _joined_rows(conn, students, first_day, last_day)
+                    if (row[0], none if row[3] is None else row[3]) > after_key)
+        # Start with one student and widen the step, since most students bring many rows
+        next_id, students_wanted = students[-1][0] + 1, min(students_wanted * 4, limit)
+    return _joined_records(rows[:limit])
+
+@cached_read
 def get_attendance_summary():
     """Aggregate: Count attendance by status."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('SELECT status, COUNT(*) FROM attendance GROUP BY status')
-    summary = cursor.fetchall()
-    conn.close()
-    return summary
+    return [(STATUS_CATEGORIES[status], count) for status, count in get_connection().execute(
+        'SELECT status, SUM(count) FROM attendance_daily_counts GROUP BY status')]
+
+@cached_read
+def get_attendance_summary_by_date_range(start_date, end_date):
+    """Aggregate: Count attendance by status within a date range."""
+    return [(STATUS_CATEGORIES[status], count) for status, count in get_connection().execute('''
+        SELECT status, SUM(count)
+        FROM attendance_daily_counts
+        WHERE date BETWEEN ? AND ?
+        GROUP BY status
+    ''', (to_day(start_date), to_day(end_date)))]
+
+@cached_read
+def get_daily_attendance_rates(start_date, end_date):
+    """Per-day (date, present, absent, rate) for days with records; rate is the percentage present."""
+    return [(to_date(day), present, absent, rate) for day, present, absent, rate in get_connection().execute('''
+        SELECT date, present, absent, ROUND(100.0 * present / total, 1)
+        FROM (
+            SELECT date,
+                   SUM(CASE WHEN status = 1 THEN count ELSE 0 END) AS present,
+                   SUM(CASE WHEN status = 2 THEN count ELSE 0 END) AS absent,
+                   SUM(count) AS total
+            FROM attendance_daily_counts
+            WHERE date BETWEEN ? AND ?
+            GROUP BY date
+        )
+        ORDER BY date
+    ''', (to_day(start_date), to_day(end_date)))]
+
+@cached_read
+def get_attendance_rates(start_date, end_date):
+    """Per-student attendance over a date range as columns.
+
+    Returns a dict of equal-length lists: student_id, name, present, absent, not_recorded and
+    rate, the percentage of days in the range marked Present.
+    """
+    conn = get_connection()
+    first, last = to_day(start_date), to_day(end_date)
+    totals = _student_totals(conn, first, last)
+    if totals is not None:
+        students = conn.execute('SELECT id, name FROM students ORDER BY id').fetchall()
+        return _attendance_rate_columns(_attendance_rate_rows(students, totals, last - first + 1))
+    rows = conn.execute('''
+        SELECT id, name, present, absent, days - present - absent, ROUND(100.0 * present / days, 1)
+        FROM (
+            SELECT s.id, s.name,
+                   SUM(CASE WHEN a.status = 1 THEN 1 ELSE 0 END) AS present,
+                   SUM(CASE WHEN a.status = 2 THEN 1 ELSE 0 END) AS absent,
+                   :end - :start + 1 AS days
+            FROM students s
+            LEFT JOIN attendance a ON a.student_id = s.id AND a.date BETWEEN :start AND :end
+            GROUP BY s.id
+        )
+        ORDER BY id
+    ''', {'start': first, 'end': last}).fetchall()
+    # Partitioned and compacted history is added on top of the live rows counted above
+    history = _student_status_counts(conn, first, last, live=False)
+    if history:
+        counts = {sid: (present + history.get(sid, (0, 0))[0], absent + history.get(sid, (0, 0))[1])
+                  for sid, _, present, absent, _, _ in rows}
+        rows = _attendance_rate_rows([(sid, name) for sid, name, *_ in rows], counts, last - first + 1)
+    return _attendance_rate_columns(rows)
+
+def _student_totals(conn, first_day, last_day):
+    """{student_id: (present, absent)} from attendance_student_counts; None unless the range covers every day.
+
+    The count table already includes archived partitions and compacted terms, so a range over the
+    whole history reads one row per student and status instead of scanning any attendance.
+    """
+    first, last = conn.execute('SELECT MIN(date), MAX(date) FROM attendance_daily_counts').fetchone()
+    if first is not None and not (first_day <= first and last <= last_day):
+        return None
+    return {student_id: (present, absent) for student_id, present, absent in conn.execute('''
+        SELECT student_id, SUM(CASE WHEN status = 1 THEN count ELSE 0 END),
+               SUM(CASE WHEN status = 2 THEN count ELSE 0 END)
+        FROM attendance_student_counts
+        GROUP BY student_id
+    ''')}
+
+def _student_status_counts(conn, first_day, last_day, live=True, first_id=None, last_id=None):
+    """{student_id: (present, absent)} over a range of day numbers, from every place attendance is kept.
+
+    Counts live rows (unless live is False), archived partitions and compacted terms, optionally
+    only for student ids first_id..last_id; students without any record are left out.
+    """
+    counts = {}
+
+    def add(student_ids, presents, absents):
+        for student_id, present, absent in zip(student_ids, presents, absents):
+            previous = counts.get(student_id, (0, 0))
+            counts[student_id] = (previous[0] + present, previous[1] + absent)
+
+    # A student range turns the scan into one walk of idx_attendance_student_date in group order;
+    # without one, idx_attendance_date narrows to the days and a temporary B-tree does the grouping
+    students = '' if first_id is None else 'AND student_id BETWEEN :first_id AND :last_id'
+    params = {'start': first_day, 'end': last_day, 'first_id': first_id, 'last_id': last_id}
+    for schema in _attendance_schemas(conn, first_day, last_day):
+        if schema == 'main' and not live:
+            continue
+        rows = conn.execute(f'''
+            SELECT student_id, SUM(status = 1), SUM(status = 2)
+            FROM {schema}.attendance
+            WHERE date BETWEEN :start AND :end {students}
+            GROUP BY student_id
+        ''', params).fetchall()
+        if rows:
+            add(*zip(*rows))
+    for student_ids, _, codes in _iter_compacted(conn, first_day, last_day, first_id, last_id):
+        add(student_ids.tolist(), (codes == 1).sum(axis=1).tolist(), (codes == 2).sum(axis=1).tolist())
+    return counts
 
+def _attendance_rate_rows(students, counts, days):
+    """get_attendance_rates rows from (id, name) pairs, _student_status_counts() and the days in the range."""
+    rows = []
+    for sid, name in students:
+        present, absent = counts.get(sid, (0, 0))
+        # Rounded half away from zero like SQLite's ROUND, not to even like round()
+        rows.append((sid, name, present, absent, days - present - absent,
+                     math.floor(1000.0 * present / days + 0.5) / 10))
+    return rows
+
+def _attendance_rate_columns(rows):
+    """Turn get_attendance_rates rows into its dict of columns."""
+    columns = ('student_id', 'name', 'present', 'absent', 'not_recorded', 'rate')
+    values = list(zip(*rows)) or [()] * len(columns)
+    return {column: list(column_values) for column, column_values in zip(columns, values)}
+
+@cache.invalidates
+def rebuild_attendance_counts():
+    """Recreate the attendance count tables from scratch."""
+    with db.transaction(get_connection()) as conn:
+        _rebuild_counts(conn)
+
+@cached_read
 def get_average_grade():
     """Aggregate: Average grade of all students."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('SELECT AVG(grade) FROM students')
-    avg = cursor.fetchone()[0]
-    conn.close()
-    return avg
+    return get_connection().execute('SELECT AVG(grade) FROM students').fetchone()[0]
 
+@cached_read
 def get_attendance_by_date_range(start_date, end_date):
-    """Filter attendance by date range."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM attendance WHERE date BETWEEN ? AND ?', (start_date, end_date))
-    records = cursor.fetchall()
-    conn.close()
+    """Filter attendance by date range; compacted records have an id of None."""
+    conn = get_connection()
+    first, last = to_day(start_date), to_day(end_date)
+    records = []
+    for schema in _attendance_schemas(conn, first, last):
+        records.extend(_records(conn.execute(f'SELECT * FROM {schema}.attendance WHERE date BETWEEN ? AND ?',
+                                             (first, last))))
+    for student_ids, days, codes in _iter_compacted(conn, first, last):
+        records.extend((None, student_id, date, status)
+                       for student_id, date, status in _compacted_records(student_ids, days, codes))
     return records
+
+@cached_read
 def get_attendance_matrix(start_date, end_date):
     """Get attendance matrix for date range as dict of {student_id: {date: status}}."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
-        SELECT student_id, date, status
-        FROM attendance
-        WHERE date BETWEEN ? AND ?
-        ORDER BY student_id, date
-    ''', (start_date, end_date))
-    records = cursor.fetchall()
-    conn.close()
-
+    conn = get_connection()
+    first, last = to_day(start_date), to_day(end_date)
     matrix = {}
-    for student_id, date, status in records:
-        if student_id not in matrix:
-            matrix[student_id] = {}
-        matrix[student_id][date] = status
+    for student_ids, days, codes in _iter_compacted(conn, first, last):
+        for student_id, date, status in _compacted_records(student_ids, days, codes):
+            if student_id not in matrix:
+                matrix[student_id] = {}
+            matrix[student_id][date] = status
+
+    # Walking idx_attendance_date in order avoids a sort; dicts still come out date-ordered
+    # (compacted terms and partitions never overlap live rows or each other)
+    dates = [to_date(day) for day in range(first, last + 1)]
+    for schema in _attendance_schemas(conn, first, last):
+        records = conn.execute(f'''
+            SELECT student_id, date, status
+            FROM {schema}.attendance
+            WHERE date BETWEEN ? AND ?
+            ORDER BY date
+        ''', (first, last))
+        for student_id, day, status in records:
+            if student_id not in matrix:
+                matrix[student_id] = {}
+            matrix[student_id][dates[day - first]] = STATUS_CATEGORIES[status]
     return matrix
 
+@cache.invalidates
 def update_attendance_matrix(attendance_data):
-    """Update multiple attendance records. attendance_data is dict of {student_id: {date: status}}."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-
-    for student_id, dates in attendance_data.items():
-        for date, status in dates.items():
-            # Check if record exists
-            cursor.execute('SELECT id FROM attendance WHERE student_id = ? AND date = ?', (student_id, date))
-            existing = cursor.fetchone()
-            if existing:
-                cursor.execute('UPDATE attendance SET status = ? WHERE student_id = ? AND date = ?',
-                             (status, student_id, date))
-            else:
-                cursor.execute('INSERT INTO attendance (student_id, date, status) VALUES (?, ?, ?)',
-                             (student_id, date, status))
+    """Upsert multiple attendance records in one transaction.
+
+    attendance_data is dict of {student_id: {date: status}}. Returns (inserted, updated);
+    cells whose status is already stored are left untouched and counted in neither.
+    """
+    rows = [(student_id, to_day(date), to_status_code(status))
+            for student_id, dates in attendance_data.items()
+            for date, status in dates.items()]
+    conn = get_connection()
+    with db.transaction(conn):
+        last_id = conn.execute('SELECT IFNULL(MAX(id), 0) FROM attendance').fetchone()[0]
+        # rowcount, unlike conn.total_changes, leaves out the rows the count triggers write
+        changed = conn.executemany('''
+            INSERT INTO attendance (student_id, date, status) VALUES (?, ?, ?)
+            ON CONFLICT (student_id, date) DO UPDATE SET status = excluded.status
+            WHERE status <> excluded.status
+        ''', rows).rowcount
+        # New rows are exactly those with an id past the previous maximum
+        inserted = conn.execute('SELECT COUNT(*) FROM attendance WHERE id > ?', (last_id,)).fetchone()[0]
+    return inserted, changed - inserted
 
-    conn.commit()
-    conn.close()
+@cached_read
 def get_attendance_by_date(date):
     """Get attendance records for a specific date as a dict of student_id: status."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('SELECT student_id, status FROM attendance WHERE date = ?', (date,))
-    records = cursor.fetchall()
-    conn.close()
-    return {sid: status for sid, status in records}
+    conn = get_connection()
+    day = to_day(date)
+    attendance = {}
+    for schema in _attendance_schemas(conn, day, day):
+        records = conn.execute(f'SELECT student_id, status FROM {schema}.attendance WHERE date = ?', (day,))
+        attendance.update((sid, STATUS_CATEGORIES[status]) for sid, status in records)
+    for student_ids, days, codes in _iter_compacted(conn, day, day):
+        attendance.update((sid, status) for sid, _, status in _compacted_records(student_ids, days, codes))
+    return attendance
 
+@cache.invalidates
 def delete_attendance_by_student_date(student_id, date):
     """Delete attendance record for a specific student and date."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute('DELETE FROM attendance WHERE student_id = ? AND date = ?', (student_id, date))
-    conn.commit()
-    conn.close()
+    get_connection().execute('DELETE FROM attendance WHERE student_id = ? AND date = ?', (student_id, to_day(date)))
+
+@cached_read
+def get_attendance_frame(start_date, end_date):
+    """Get a wide pandas DataFrame with one row per student and one categorical column per date.
+
+    Columns are Student, ID, Grade and then every date from start_date to end_date;
+    days without a record are 'Not Recorded'. Like every cached read the frame is shared, so
+    copy it before changing it in place.
+    """
+    import numpy as np
+    import pandas as pd
+
+    conn = get_connection()
+    students = pd.read_sql_query('SELECT name AS "Student", id AS "ID", grade AS "Grade" FROM students ORDER BY id',
+                                 conn)
+    student_index = pd.Index(students['ID'])
+    first, last = to_day(start_date), to_day(end_date)
+    dates = [to_date(day) for day in range(first, last + 1)]
+
+    # One row per day, each packing student_id * 4 + status code into a comma-separated list,
+    # so only len(dates) Python objects are created instead of one tuple per record
+    codes = np.zeros((len(students), len(dates)), dtype=np.int8)
+    for schema in _attendance_schemas(conn, first, last):
+        records = conn.execute(f'''
+            SELECT date, group_concat(student_id * 4 + status)
+            FROM {schema}.attendance
+            WHERE date BETWEEN ? AND ?
+            GROUP BY date
+        ''', (first, last))
+        for day, packed in records:
+            values = np.array(packed.split(','), dtype=np.int64)
+            rows = student_index.get_indexer(values >> 2)
+            found = rows >= 0
+            codes[rows[found], day - first] = values[found] & 3
+    for student_ids, days, term_codes in _iter_compacted(conn, first, last):
+        rows = student_index.get_indexer(student_ids)
+        found = rows >= 0
+        codes[np.ix_(rows[found], np.asarray(days) - first)] = term_codes[found]
+
+    status_columns = {date: pd.Categorical.from_codes(codes[:, i], categories=STATUS_CATEGORIES)
+                      for i, date in enumerate(dates)}
+    return pd.concat([students, pd.DataFrame(status_columns, index=students.index)], axis=1)
+
+def _status_codes(frame, columns):
+    """Encode status columns as a 2D int8 array of STATUS_CATEGORIES codes; blanks become 0."""
+    import numpy as np
+    import pandas as pd
+
+    codes = np.zeros((len(frame), len(columns)), dtype=np.int8)
+    for i, column in enumerate(columns):
+        codes[:, i] = pd.Categorical(frame[column], categories=STATUS_CATEGORIES).codes
+    codes[codes < 0] = 0
+    return codes
+
+def diff_attendance_frames(original, edited):
+    """Compare two attendance frames from get_attendance_frame and return the minimal change set.
+
+    Returns (upserts, deletes): upserts is a list of (student_id, date, status) and deletes
+    a list of (student_id, date) for cells changed to 'Not Recorded'.
+    """
+    import numpy as np
+
+    dates = [column for column in original.columns if column not in ('Student', 'ID', 'Grade')]
+    edited = edited.loc[original.index]
+    old = _status_codes(original, dates)
+    new = _status_codes(edited, dates)
+    changed = old != new
+
+    student_ids = original['ID'].to_numpy()
+    dates = np.array(dates, dtype=object)
+    statuses = np.array(STATUS_CATEGORIES, dtype=object)
 
+    rows, cols = np.nonzero(changed & (new > 0))
+    upserts = list(zip(student_ids[rows].tolist(), dates[cols].tolist(), statuses[new[rows, cols]].tolist()))
+    rows, cols = np.nonzero(changed & (new == 0))
+    deletes = list(zip(student_ids[rows].tolist(), dates[cols].tolist()))
+    return upserts, deletes
+
+@cache.invalidates
+def apply_attendance_changes(upserts, deletes):
+    """Apply a change set from diff_attendance_frames in one transaction; returns (written, deleted)."""
+    upserts = [(student_id, to_day(date), to_status_code(status)) for student_id, date, status in upserts]
+    deletes = [(student_id, to_day(date)) for student_id, date in deletes]
+    conn = get_connection()
+    with db.transaction(conn):
+        written = conn.executemany('''
+            INSERT INTO attendance (student_id, date, status) VALUES (?, ?, ?)
+            ON CONFLICT (student_id, date) DO UPDATE SET status = excluded.status
+            WHERE status <> excluded.status
+        ''', upserts).rowcount
+        deleted = conn.executemany('DELETE FROM attendance WHERE student_id = ? AND date = ?', deletes).rowcount
+    return written, deleted
+
+def _student_ids_param(student_ids):
+    """Encode an optional student id filter as one JSON parameter for json_each()."""
+    import json
+
+    return None if student_ids is None else json.dumps([int(sid) for sid in student_ids])
+
+@cache.invalidates
+def clear_attendance_range(start_date, end_date, student_ids=None):
+    """Delete every attendance record in a date range, optionally for given students only."""
+    cursor = get_connection().execute('''
+        DELETE FROM attendance
+        WHERE date BETWEEN :start AND :end
+          AND (:ids IS NULL OR student_id IN (SELECT value FROM json_each(:ids)))
+    ''', {'start': to_day(start_date), 'end': to_day(end_date), 'ids': _student_ids_param(student_ids)})
+    return cursor.rowcount
+
+@cache.invalidates
+def mark_all(status, start_date, end_date, student_ids=None):
+    """Set status for every student and every day in a date range; returns rows written."""
+    conn = get_connection()
+    conn.execute('''
+        WITH RECURSIVE days (day) AS (
+            SELECT :start
+            UNION ALL
+            SELECT day + 1 FROM days WHERE day < :end
+        )
+        INSERT INTO attendance (student_id, date, status)
+        SELECT s.id, days.day, :status
+        FROM students s CROSS JOIN days
+        WHERE :ids IS NULL OR s.id IN (SELECT value FROM json_each(:ids))
+        ON CONFLICT (student_id, date) DO UPDATE SET status = excluded.status
+        WHERE status <> excluded.status
+    ''', {'start': to_day(start_date), 'end': to_day(end_date), 'status': to_status_code(status),
+          'ids': _student_ids_param(student_ids)})
+    # cursor.rowcount is not reported for statements that start with WITH; changes() leaves
+    # out the rows the count triggers write, which conn.total_changes would include
+    return conn.execute('SELECT changes()').fetchone()[0]
+
+# Compacted attendance history: finished terms packed into two bits per student per day
+# (see migrations._add_attendance_bitsets). Every reader and the count tables include compacted
+# records, except get_attendance_page, which lists the live rows that can still be edited by id.
+
+def _compacted_terms(conn, first_day, last_day):
+    """(start day, end day) of every compacted term overlapping a range of day numbers, oldest first."""
+    return conn.execute('''
+        SELECT start_date, end_date FROM attendance_terms
+        WHERE start_date <= ? AND end_date >= ?
+        ORDER BY start_date
+    ''', (last_day, first_day)).fetchall()
+
+def _iter_compacted(conn, first_day, last_day, first_id=None, last_id=None):
+    """Decode compacted attendance in a range of day numbers, one term at a time.
+
+    With first_id and last_id only students with ids in that range are decoded.
+
+    Yields (student_ids, days, codes): an int64 array of student ids, the day numbers covered
+    and an int8 array of STATUS_CATEGORIES codes with one row per student and one column per day.
+    """
+    terms = _compacted_terms(conn, first_day, last_day)
+    if not terms:
+        return
+    import numpy as np
+
+    for term_start, term_end in terms:
+        lo = max(first_day, term_start) - term_start
+        hi = min(last_day, term_end) - term_start
+        # Fetch only the bytes holding days lo..hi
+        offset, length = lo // 8, hi // 8 - lo // 8 + 1
+        rows = conn.execute('''
+            SELECT student_id, substr(recorded, :offset, :length), substr(present, :offset, :length)
+            FROM attendance_bitsets
+            WHERE term_start = :term AND (:first IS NULL OR student_id BETWEEN :first AND :last)
+            ORDER BY student_id
+        ''', {'offset': offset + 1, 'length': length, 'term': term_start,
+              'first': first_id, 'last': last_id}).fetchall()
+        if not rows:
+            continue
+        student_ids, recorded, present = zip(*rows)
+        bits = slice(lo - offset * 8, hi - offset * 8 + 1)
+        recorded = np.unpackbits(np.frombuffer(b''.join(recorded), dtype=np.uint8).reshape(len(rows), length),
+                                 axis=1, bitorder='little')[:, bits]
+        present = np.unpackbits(np.frombuffer(b''.join(present), dtype=np.uint8).reshape(len(rows), length),
+                                axis=1, bitorder='little')[:, bits]
+        # Present is code 1 and Absent code 2; unrecorded days stay 0
+        codes = (recorded * (2 - present)).astype(np.int8)
+        yield np.array(student_ids, dtype=np.int64), list(range(term_start + lo, term_start + hi + 1)), codes
+
+def _compacted_records(student_ids, days, codes, decode=True):
+    """Turn one term from _iter_compacted into (student_id, date, status) tuples, student by student.
+
+    With decode=False the date stays a day number and the status a code.
+    """
+    import numpy as np
+
+    rows, cols = np.nonzero(codes)
+    dates = np.array([to_date(day) for day in days] if decode else days, dtype=object)
+    statuses = np.array(STATUS_CATEGORIES if decode else range(len(STATUS_CATEGORIES)), dtype=object)
+    return zip(student_ids[rows].tolist(), dates[cols].tolist(), statuses[codes[rows, cols]].tolist())
+
+def _rebuild_counts(conn):
+    """Rebuild the count tables from attendance rows, then add the partitions and compacted terms."""
+    migrations.rebuild_attendance_counts(conn)
+    for _, _, file in _partitions(conn, MIN_DAY, MAX_DAY):
+        source = _open_partition(file)
+        try:
+            daily = source.execute('SELECT date, status, COUNT(*) FROM attendance GROUP BY date, status').fetchall()
+            per_student = source.execute('''
+                SELECT student_id, status, COUNT(*) FROM attendance GROUP BY student_id, status
+            ''').fetchall()
+        finally:
+            source.close()
+        conn.executemany('''
+            INSERT INTO attendance_daily_counts (date, status, count) VALUES (?, ?, ?)
+            ON CONFLICT (date, status) DO UPDATE SET count = count + excluded.count
+        ''', daily)
+        conn.executemany('''
+            INSERT INTO attendance_student_counts (student_id, status, count) VALUES (?, ?, ?)
+            ON CONFLICT (student_id, status) DO UPDATE SET count = count + excluded.count
+        ''', per_student)
+    for student_ids, days, codes in _iter_compacted(conn, MIN_DAY, MAX_DAY):
+        for status in (1, 2):
+            hits = codes == status
+            conn.executemany('''
+                INSERT INTO attendance_daily_counts (date, status, count) VALUES (?, ?, ?)
+                ON CONFLICT (date, status) DO UPDATE SET count = count + excluded.count
+            ''', ((day, status, n) for day, n in zip(days, hits.sum(axis=0).tolist()) if n))
+            conn.executemany('''
+                INSERT INTO attendance_student_counts (student_id, status, count) VALUES (?, ?, ?)
+                ON CONFLICT (student_id, status) DO UPDATE SET count = count + excluded.count
+            ''', ((sid, status, n) for sid, n in zip(student_ids.tolist(), hits.sum(axis=1).tolist()) if n))
+
+def _delete_compacted_students(conn, student_ids):
+    """Remove the compacted history of a sorted list of students, taking it out of the daily counts too."""
+    wanted = set(student_ids)
+    decrements = []
+    for term_ids, days, codes in _iter_compacted(conn, MIN_DAY, MAX_DAY, student_ids[0], student_ids[-1]):
+        codes = codes[[i for i, sid in enumerate(term_ids.tolist()) if sid in wanted]]
+        for status in (1, 2):
+            decrements.extend((n, day, status) for day, n in zip(days, (codes == status).sum(axis=0).tolist()) if n)
+    if decrements:
+        conn.executemany('UPDATE attendance_daily_counts SET count = count - ? WHERE date = ? AND status = ?',
+                         decrements)
+        conn.execute('DELETE FROM attendance_daily_counts WHERE count <= 0')
+    conn.executemany('''
+        DELETE FROM attendance_bitsets
+        WHERE term_start IN (SELECT start_date FROM attendance_terms) AND student_id = ?
+    ''', [(sid,) for sid in student_ids])
+
+@cache.invalidates
+def compact_attendance(start_date, end_date):
+    """Pack a finished term's attendance records into per-student bitsets.
+
+    The term becomes read-only: inserts dated inside it are rejected until expand_attendance().
+    Returns the number of records compacted; VACUUM afterwards to hand the freed pages back to
+    the filesystem.
+    """
+    import numpy as np
+
+    first, last = to_day(start_date), to_day(end_date)
+    if last < first:
+        raise ValueError(f"term ends ({end_date}) before it starts ({start_date})")
+    conn = get_connection()
+    with db.transaction(conn):
+        if _compacted_terms(conn, first, last):
+            raise ValueError(f"{start_date} to {end_date} overlaps a term that is already compacted")
+        if _partitions(conn, first, last):
+            raise ValueError(f"{start_date} to {end_date} overlaps an archived partition")
+        # Same per-day packing as get_attendance_frame: student_id * 4 + status code
+        values, cols = [], []
+        for day, packed in conn.execute('''
+            SELECT date, group_concat(student_id * 4 + status)
+            FROM attendance
+            WHERE date BETWEEN ? AND ?
+            GROUP BY date
+        ''', (first, last)):
+            day_values = np.array(packed.split(','), dtype=np.int64)
+            values.append(day_values)
+            cols.append(np.full(len(day_values), day - first))
+        if values:
+            values = np.concatenate(values)
+            student_ids, rows = np.unique(values >> 2, return_inverse=True)
+            codes = np.zeros((len(student_ids), last - first + 1), dtype=np.uint8)
+            codes[rows, np.concatenate(cols)] = values & 3
+            recorded = np.packbits(codes > 0, axis=1, bitorder='little')
+            present = np.packbits(codes == 1, axis=1, bitorder='little')
+            conn.executemany('''
+                INSERT INTO attendance_bitsets (term_start, student_id, recorded, present) VALUES (?, ?, ?, ?)
+            ''', ((first, sid, r.tobytes(), p.tobytes())
+                  for sid, r, p in zip(student_ids.tolist(), recorded, present)))
+
+        # The count tables go on counting compacted records, so delete without the count triggers
+        migrations.drop_attendance_count_triggers(conn)
+        total = conn.execute('SELECT IFNULL(SUM(count), 0) FROM attendance_daily_counts').fetchone()[0]
+        # Removing a big share of the table row by row thrashes both indexes; rebuilding them is faster
+        rebuild_indexes = len(values) > total // 10
+        if rebuild_indexes:
+            migrations.drop_attendance_indexes(conn)
+        compacted = conn.execute('DELETE FROM attendance WHERE date BETWEEN ? AND ?', (first, last)).rowcount
+        if rebuild_indexes:
+            migrations.create_attendance_indexes(conn)
+        migrations.create_attendance_count_triggers(conn)
+        conn.execute('INSERT INTO attendance_terms (start_date, end_date) VALUES (?, ?)', (first, last))
+        migrations.create_attendance_term_triggers(conn)
+    return compacted
+
+@cache.invalidates
+def expand_attendance(term_start):
+    """Turn a compacted term back into attendance rows so it can be edited; returns records restored."""
+    conn = get_connection()
+    with db.transaction(conn):
+        term = conn.execute('SELECT start_date, end_date FROM attendance_terms WHERE start_date = ?',
+                            (to_day(term_start),)).fetchone()
+        if term is None:
+            raise ValueError(f"no compacted term starts on {term_start}")
+        records = [record for student_ids, days, codes in _iter_compacted(conn, *term)
+                   for record in _compacted_records(student_ids, days, codes, decode=False)]
+        conn.execute('DELETE FROM attendance_terms WHERE start_date = ?', (term[0],))
+        conn.execute('DELETE FROM attendance_bitsets WHERE term_start = ?', (term[0],))
+        if conn.execute('SELECT COUNT(*) FROM attendance_terms').fetchone()[0] == 0:
+            migrations.drop_attendance_term_triggers(conn)
+        # Already counted while compacted
+        migrations.drop_attendance_count_triggers(conn)
+        conn.executemany('INSERT INTO attendance (student_id, date, status) VALUES (?, ?, ?)', records)
+        migrations.create_attendance_count_triggers(conn)
+    return len(records)
+
+@cached_read
+def get_compacted_terms():
+    """List compacted terms as (start_date, end_date, students)."""
+    return [(to_date(start), to_date(end), students) for start, end, students in get_connection().execute('''
+        SELECT t.start_date, t.end_date, COUNT(b.student_id)
+        FROM attendance_terms t
+        LEFT JOIN attendance_bitsets b ON b.term_start = t.start_date
+        GROUP BY t.start_date
+        ORDER BY t.start_date
+    ''')]
+
+# Partitioned attendance history: date ranges of attendance rows moved out of DB_FILE into
+# their own files (see migrations._add_attendance_partitions), so the live table and its
+# indexes only hold the current terms. Partition files are never changed in place, so they
+# are attached read-only with immutable=1 and SQLite skips locking them. The same readers as
+# for compacted terms include them, pruned to the partitions overlapping the requested range.
+
+# Partitions attached to one connection at once; SQLite allows 10 attached databases by default
+MAX_ATTACHED_PARTITIONS = 8
+
+def _partition_path(file):
+    """Path of a partition file, which lives next to DB_FILE."""
+    return os.path.join(os.path.dirname(os.path.abspath(DB_FILE)), file)
+
+def _partition_file(first_day, last_day):
+    """A new, unused file name for the partition holding a range of day numbers."""
+    stem = os.path.splitext(os.path.basename(DB_FILE))[0]
+    name = f'{stem}.attendance-{to_date(first_day)}-{to_date(last_day)}'
+    generation = 1
+    while os.path.exists(_partition_path(f'{name}.{generation}.db')):
+        generation += 1
+    return f'{name}.{generation}.db'
+
+def _open_partition(file):
+    """A private read-only connection to a partition file, for use inside a transaction on DB_FILE."""
+    return sqlite3.connect(f'file:{_partition_path(file)}?mode=ro&immutable=1', uri=True)
+
+def _partitions(conn, first_day, last_day):
+    """(start day, end day, file) of every partition overlapping a range of day numbers, oldest first."""
+    return conn.execute('''
+        SELECT start_date, end_date, file FROM attendance_partitions
+        WHERE start_date <= ? AND end_date >= ?
+        ORDER BY start_date
+    ''', (last_day, first_day)).fetchall()
+
+def _attendance_schemas(conn, first_day, last_day):
+    """Schema names holding attendance rows in a range of day numbers, oldest partition first.
+
+    Yields the partitions that overlap the range MAX_ATTACHED_PARTITIONS at a time, attaching each
+    group only when it is reached, so read a schema before asking for the next one. 'main' comes
+    last and is left out when one partition covers the whole range, as no live row can be dated there.
+    """
+    partitions = _partitions(conn, first_day, last_day)
+    for group in range(0, len(partitions), MAX_ATTACHED_PARTITIONS):
+        yield from _attach_partitions(conn, partitions[group:group + MAX_ATTACHED_PARTITIONS])
+    if partitions:
+        start, end, _ = partitions[0]
+        if len(partitions) == 1 and start <= first_day and last_day <= end:
+            return
+    yield 'main'
+
+def _attach_partitions(conn, partitions):
+    """Attach partitions (and detach stale or surplus ones); returns their schema names."""
+    attached = {name: path for _, name, path in conn.execute('PRAGMA database_list') if name.startswith('partition_')}
+    wanted = {f'partition_{start - MIN_DAY}': _partition_path(file) for start, _, file in partitions}
+    crowded = len(attached.keys() | wanted.keys()) > MAX_ATTACHED_PARTITIONS
+    for name, path in attached.items():
+        # Detach partitions that were rewritten, and make room when too many are attached
+        if wanted.get(name, path) != path or (crowded and name not in wanted):
+            conn.execute(f'DETACH DATABASE {name}')
+    attached = {name for _, name, _ in conn.execute('PRAGMA database_list')}
+    for name, path in wanted.items():
+        if name not in attached:
+            conn.execute(f'ATTACH DATABASE ? AS {name}', (f'file:{path}?mode=ro&immutable=1',))
+    return list(wanted)
+
+@contextmanager
+def _partition_rewrite(conn):
+    """db.transaction() for writes that replace partition files; yields a list for (old file, new file) pairs.
+
+    When the transaction is its own, the old files are removed once it commits, or the new ones if
+    it rolls back. Inside a caller's transaction, such as the shared writer's, both are left for
+    remove_stale_partitions().
+    """
+    owner = not conn.in_transaction
+    rewritten = []
+    try:
+        with db.transaction(conn):
+            yield rewritten
+    except BaseException:
+        if owner:
+            _remove_partition_files(new for _, new in rewritten)
+        raise
+    if owner:
+        _remove_partition_files(old for old, _ in rewritten)
+
+def _remove_partition_files(files):
+    """Delete partition files; any still open elsewhere on Windows are left for remove_stale_partitions()."""
+    for file in files:
+        try:
+            os.remove(_partition_path(file))
+        except OSError:
+            pass
+
+def _delete_partitioned_students(conn, student_ids, rewritten):
+    """Rewrite each partition holding rows of the given students without them, taking them out of the daily counts.
+
+    Runs inside the caller's _partition_rewrite() and adds (old file, new file) to its rewritten list.
+    """
+    ids = _student_ids_param(student_ids)
+    for start, end, file in _partitions(conn, MIN_DAY, MAX_DAY):
+        source = _open_partition(file)
+        try:
+            decrements = source.execute('''
+                SELECT COUNT(*), date, status FROM attendance
+                WHERE student_id IN (SELECT value FROM json_each(?))
+                GROUP BY date, status
+            ''', (ids,)).fetchall()
+        finally:
+            source.close()
+        if not decrements:
+            continue
+        new_file = _partition_file(start, end)
+        _write_partition(new_file, f'file:{_partition_path(file)}?mode=ro&immutable=1', '''
+            SELECT * FROM source.attendance WHERE student_id NOT IN (SELECT value FROM json_each(?))
+        ''', (ids,))
+        rewritten.append((file, new_file))
+        conn.execute('UPDATE attendance_partitions SET file = ? WHERE start_date = ?', (new_file, start))
+        conn.executemany('UPDATE attendance_daily_counts SET count = count - ? WHERE date = ? AND status = ?',
+                         decrements)
+        conn.execute('DELETE FROM attendance_daily_counts WHERE count <= 0')
+
+def _write_partition(file, source, select_sql, params=()):
+    """Create a partition file from select_sql run against the database `source` attached as source.
+
+    Returns the number of rows written.
+    """
+    path = _partition_path(file)
+    partial = path + '.partial'
+    if os.path.exists(partial):
+        os.remove(partial)
+    part = sqlite3.connect(partial, isolation_level=None, uri=True)
+    try:
+        part.execute('ATTACH DATABASE ? AS source', (source,))
+        # DEFERRED: an IMMEDIATE transaction would also take the write lock on the attached source
+        with db.transaction(part, 'DEFERRED'):
+            migrations.create_partition_schema(part)
+            rows = part.execute(f'INSERT INTO attendance {select_sql} ORDER BY date, student_id', params).rowcount
+            migrations.create_attendance_indexes(part)
+        part.execute('DETACH DATABASE source')
+        part.execute('PRAGMA journal_mode = DELETE')
+    except BaseException:
+        part.close()
+        os.remove(partial)
+        raise
+    part.close()
+    os.replace(partial, path)
+    return rows
+
+@cache.invalidates
+def archive_attendance(start_date, end_date):
+    """Move a finished term's or year's attendance rows into a partition file of their own.
+
+    The range becomes read-only, like a compacted term, until unarchive_attendance(). Counts
+    and the range readers still include it. Returns the number of rows moved; VACUUM afterwards
+    to hand the freed pages back to the filesystem.
+    """
+    first, last = to_day(start_date), to_day(end_date)
+    if last < first:
+        raise ValueError(f"range ends ({end_date}) before it starts ({start_date})")
+    conn = get_connection()
+    with db.transaction(conn):
+        if _partitions(conn, first, last) or _compacted_terms(conn, first, last):
+            raise ValueError(f"{start_date} to {end_date} overlaps an archived partition or compacted term")
+        # The write lock is held, so the rows copied are exactly the rows deleted below
+        file = _partition_file(first, last)
+        copied = _write_partition(file, os.path.abspath(DB_FILE),
+                                  'SELECT * FROM source.attendance WHERE date BETWEEN ? AND ?', (first, last))
+        try:
+            # The count tables go on counting archived rows, so delete without the count triggers
+            migrations.drop_attendance_count_triggers(conn)
+            total = conn.execute('SELECT IFNULL(SUM(count), 0) FROM attendance_daily_counts').fetchone()[0]
+            moved = conn.execute('SELECT COUNT(*) FROM attendance WHERE date BETWEEN ? AND ?',
+                                 (first, last)).fetchone()[0]
+            if moved != copied:
+                # The copy reads committed data only; rows written earlier in an enclosing transaction are missing
+                raise RuntimeError("archive_attendance must not run inside another transaction")
+            # As in compact_attendance, rebuild the indexes rather than thrash them on a big delete
+            rebuild_indexes = moved > total // 10
+            if rebuild_indexes:
+                migrations.drop_attendance_indexes(conn)
+            conn.execute('DELETE FROM attendance WHERE date BETWEEN ? AND ?', (first, last))
+            if rebuild_indexes:
+                migrations.create_attendance_indexes(conn)
+            migrations.create_attendance_count_triggers(conn)
+            conn.execute('INSERT INTO attendance_partitions (start_date, end_date, file) VALUES (?, ?, ?)',
+                         (first, last, file))
+            migrations.create_attendance_partition_triggers(conn)
+        except BaseException:
+            os.remove(_partition_path(file))
+            raise
+    return moved
+
+@cache.invalidates
+def unarchive_attendance(start_date):
+    """Move an archived partition's rows back into the live table; returns the rows restored."""
+    conn = get_connection()
+    with db.transaction(conn):
+        partition = conn.execute('SELECT start_date, end_date, file FROM attendance_partitions WHERE start_date = ?',
+                                 (to_day(start_date),)).fetchone()
+        if partition is None:
+            raise ValueError(f"no archived partition starts on {start_date}")
+        source = _open_partition(partition[2])
+        try:
+            rows = source.execute('SELECT * FROM attendance').fetchall()
+        finally:
+            source.close()
+        conn.execute('DELETE FROM attendance_partitions WHERE start_date = ?', (partition[0],))
+        if conn.execute('SELECT COUNT(*) FROM attendance_partitions').fetchone()[0] == 0:
+            migrations.drop_attendance_partition_triggers(conn)
+        # Already counted while archived
+        migrations.drop_attendance_count_triggers(conn)
+        conn.executemany('INSERT INTO attendance (id, student_id, date, status) VALUES (?, ?, ?, ?)', rows)
+        migrations.create_attendance_count_triggers(conn)
+    return len(rows)
+
+@cached_read
+def get_archived_partitions():
+    """List archived partitions as (start_date, end_date, file)."""
+    return [(to_date(start), to_date(end), file) for start, end, file in get_connection().execute(
+        'SELECT start_date, end_date, file FROM attendance_partitions ORDER BY start_date')]
+
+def remove_stale_partitions():
+    """Delete partition files next to DB_FILE that are no longer referenced; returns their names.
+
+    Call this when no other connection still has an old partition attached, e.g. from the CLI.
+    """
+    referenced = {file for file, in get_connection().execute('SELECT file FROM attendance_partitions')}
+    stem = os.path.splitext(os.path.basename(DB_FILE))[0]
+    directory = os.path.dirname(_partition_path(''))
+    stale = [name for name in os.listdir(directory)
+             if name.startswith(f'{stem}.attendance-') and name.endswith('.db') and name not in referenced]
+    for name in stale:
+        os.remove(os.path.join(directory, name))
+    return stale
+
+@cache.invalidates
 def seed_data():
-    """Add example data."""
-    # Add students
-    add_student('Alice Johnson', 85.5)
-    add_student('Bob Smith', 92.0)
-    add_student('Charlie Brown', 78.3)
-
-    # Add attendance
-    add_attendance(1, '2023-09-01', 'Present')
-    add_attendance(1, '2023-09-02', 'Absent')
-    add_attendance(2, '2023-09-01', 'Present')
-    add_attendance(2, '2023-09-02', 'Present')
-    add_attendance(3, '2023-09-01', 'Absent')
-    add_attendance(3, '2023-09-02', 'Present')
+    """Add example data; running it again leaves existing rows as they are."""
+    conn = get_connection()
+    with db.transaction(conn):
+        # Add students
+        conn.executemany('INSERT INTO students (id, name, grade) VALUES (?, ?, ?) ON CONFLICT (id) DO NOTHING', [
+            (1, 'Alice Johnson', 85.5),
+            (2, 'Bob Smith', 92.0),
+            (3, 'Charlie Brown', 78.3),
+        ])
+
+        # Add attendance
+        conn.executemany('''
+            INSERT INTO attendance (student_id, date, status) VALUES (?, ?, ?)
+            ON CONFLICT (student_id, date) DO NOTHING
+        ''', [(student_id, to_day(date), to_status_code(status)) for student_id, date, status in [
+            (1, '2023-09-01', 'Present'),
+            (1, '2023-09-02', 'Absent'),
+            (2, '2023-09-01', 'Present'),
+            (2, '2023-09-02', 'Present'),
+            (3, '2023-09-01', 'Absent'),
+            (3, '2023-09-02', 'Present'),
+        ]])
+
+def school_days(start_date, days):
+    """The first `days` weekdays on or after start_date, as ISO date strings."""
+    current = datetime.strptime(start_date, '%Y-%m-%d').date()
+    result = []
+    while len(result) < days:
+        if current.weekday() < 5:
+            result.append(current.isoformat())
+        current += timedelta(days=1)
+    return result
+
+def _generated_absences(students, days, threshold, seed):
+    """Absent counts per day and per student number (from 1) of the rows generate_data inserts.
+
+    Evaluates generate_data's hash over the same grid with numpy, so the count tables are added
+    to without reading back the rows just written.
+    """
+    import numpy as np
+
+    absent_by_day = np.zeros(days, dtype=np.int64)
+    absent_by_student = []
+    day_index = np.arange(days, dtype=np.int64)
+    # Chunks of students keep the int64 grid to a few tens of megabytes
+    for first in range(1, students + 1, 10000):
+        number = np.arange(first, min(first + 10000, students + 1), dtype=np.int64)
+        h = (number[:, None] * 2654435761 + day_index * 40503 + seed * 97 + 1) % 2147483647
+        absent = h * h % 2147483647 < threshold
+        absent_by_day += absent.sum(axis=0)
+        absent_by_student.extend(absent.sum(axis=1).tolist())
+    return absent_by_day.tolist(), absent_by_student
+
+@cache.invalidates
+def generate_data(students, days, absence_probability=0.05, seed=0, start_date='2023-09-01'):
+    """Add `students` synthetic students with attendance for `days` school days from start_date.
+
+    Each cell is Absent with probability absence_probability, decided by an integer hash of
+    (student number, day number, seed), so the same arguments always produce the same data.
+    Everything is generated inside SQLite in one transaction. Returns (students, attendance rows).
+    """
+    import json
+
+    conn = get_connection()
+    day_numbers = [to_day(day) for day in school_days(start_date, days)]
+    params = {
+        'students': students,
+        'days': json.dumps(day_numbers),
+        'seed': seed,
+        'threshold': int(absence_probability * 2147483647),
+    }
+    with db.transaction(conn):
+        first_id = conn.execute('SELECT IFNULL(MAX(id), 0) FROM students').fetchone()[0]
+        params['first_id'] = first_id
+        conn.execute('''
+            WITH RECURSIVE n (i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < :students)
+            INSERT INTO students (id, name, grade)
+            SELECT :first_id + i, 'Student ' || (:first_id + i), 50 + ((i * 7919 + :seed * 104729) % 501) / 10.0
+            FROM n
+        ''', params)
+
+        # Maintaining the count tables row by row would double the load time; they are added to once instead
+        migrations.drop_attendance_count_triggers(conn)
+        total = conn.execute('SELECT IFNULL(SUM(count), 0) FROM attendance_daily_counts').fetchone()[0]
+        # Inserting a big share of the table row by row thrashes both indexes; rebuilding them is faster
+        rebuild_indexes = students * days > total // 10
+        if rebuild_indexes:
+            migrations.drop_attendance_indexes(conn)
+        # Day by day rather than student by student: measured faster to index afterwards.
+        # The hash must match _generated_absences().
+        conn.execute('''
+            WITH days (idx, day) AS MATERIALIZED (SELECT key, value FROM json_each(:days))
+            INSERT INTO attendance (student_id, date, status)
+            SELECT id, day, CASE WHEN h * h % 2147483647 < :threshold THEN 2 ELSE 1 END
+            FROM (
+                SELECT s.id, d.day,
+                       ((s.id - :first_id) * 2654435761 + d.idx * 40503 + :seed * 97 + 1) % 2147483647 AS h
+                FROM days d CROSS JOIN students s
+                WHERE s.id > :first_id
+            )
+        ''', params)
+        if rebuild_indexes:
+            migrations.create_attendance_indexes(conn)
+        migrations.create_attendance_count_triggers(conn)
+
+        absent_by_day, absent_by_student = _generated_absences(students, days, params['threshold'], seed)
+        conn.executemany('''
+            INSERT INTO attendance_daily_counts (date, status, count) VALUES (?, ?, ?)
+            ON CONFLICT (date, status) DO UPDATE SET count = count + excluded.count
+        ''', [(day, status, count) for day, absent in zip(day_numbers, absent_by_day)
+              for status, count in ((1, students - absent), (2, absent)) if count])
+        conn.executemany(
+            'INSERT INTO attendance_student_counts (student_id, status, count) VALUES (?, ?, ?)',
+            [(first_id + i, status, count) for i, absent in enumerate(absent_by_student, start=1)
+             for status, count in ((1, days - absent), (2, absent)) if count])
+    return students, students * days
 
 def cli_menu():
     """Command-line interface."""
@@ -243,8 +1368,7 @@ def cli_menu():
             add_student(name, grade)
             print("Student added.")
         elif choice == '2':
-            students = get_students()
-            for s in students:
+            for s in iter_students():
                 print(f"ID: {s[0]}, Name: {s[1]}, Grade: {s[2]}")
         elif choice == '3':
             sid = int(input("Student ID: "))
@@ -261,24 +1385,34 @@ def cli_menu():
             sid = int(input("Student ID: "))
             date = input("Date (YYYY-MM-DD): ")
             status = input("Status (Present/Absent): ")
-            add_attendance(sid, date, status)
-            print("Attendance added.")
+            try:
+                add_attendance(sid, date, status)
+            except ValueError as e:
+                print(f"Attendance not added: {e}")
+            except sqlite3.IntegrityError as e:
+                # The foreign key turns away unknown students; read-only dates bring their own message
+                unknown = e.sqlite_errorname == 'SQLITE_CONSTRAINT_FOREIGNKEY'
+                print(f"Attendance not added: {f'no such student {sid}' if unknown else e}")
+            else:
+                print("Attendance added.")
         elif choice == '6':
-            attendance = get_attendance()
-            for a in attendance:
+            for a in iter_attendance():
                 print(f"ID: {a[0]}, Student ID: {a[1]}, Date: {a[2]}, Status: {a[3]}")
         elif choice == '7':
             aid = int(input("Attendance ID: "))
             status = input("New Status: ")
-            update_attendance(aid, status)
-            print("Attendance updated.")
+            try:
+                update_attendance(aid, status)
+            except ValueError as e:
+                print(f"Attendance not updated: {e}")
+            else:
+                print("Attendance updated.")
         elif choice == '8':
             aid = int(input("Attendance ID: "))
             delete_attendance(aid)
             print("Attendance deleted.")
         elif choice == '9':
-            results = get_students_with_attendance()
-            for r in results:
+            for r in iter_students_with_attendance():
                 print(f"Student ID: {r[0]}, Name: {r[1]}, Grade: {r[2]}, Date: {r[3]}, Status: {r[4]}")
         elif choice == '10':
             summary = get_attendance_summary()
@@ -290,8 +1424,7 @@ def cli_menu():
         elif choice == '12':
             start = input("Start Date (YYYY-MM-DD): ")
             end = input("End Date (YYYY-MM-DD): ")
-            records = get_attendance_by_date_range(start, end)
-            for r in records:
+            for r in iter_attendance(start, end):
                 print(f"ID: {r[0]}, Student ID: {r[1]}, Date: {r[2]}, Status: {r[3]}")
         elif choice == '13':
             seed_data()
@@ -309,18 +1442,15 @@ def demo():
     print("Seeded data.")
 
     print("\nStudents:")
-    students = get_students()
-    for s in students:
+    for s in iter_students():
         print(f"ID: {s[0]}, Name: {s[1]}, Grade: {s[2]}")
 
     print("\nAttendance:")
-    attendance = get_attendance()
-    for a in attendance:
+    for a in iter_attendance():
         print(f"ID: {a[0]}, Student ID: {a[1]}, Date: {a[2]}, Status: {a[3]}")
 
     print("\nStudents with Attendance:")
-    results = get_students_with_attendance()
-    for r in results:
+    for r in iter_students_with_attendance():
         print(f"Student ID: {r[0]}, Name: {r[1]}, Grade: {r[2]}, Date: {r[3]}, Status: {r[4]}")
 
     print("\nAttendance Summary:")
@@ -331,16 +1461,225 @@ def demo():
     print(f"\nAverage Grade: {get_average_grade()}")
 
     print("\nAttendance from 2023-09-01 to 2023-09-01:")
-    records = get_attendance_by_date_range('2023-09-01', '2023-09-01')
-    for r in records:
+    for r in iter_attendance('2023-09-01', '2023-09-01'):
         print(f"ID: {r[0]}, Student ID: {r[1]}, Date: {r[2]}, Status: {r[3]}")
 
     print("Demo completed.")
 
-if __name__ == '__main__':
+def _read_rows(parser, convert):
+    """convert(fields) for each non-blank tab-separated line of standard input; bad lines end the command."""
     import sys
-    if len(sys.argv) > 1 and sys.argv[1] == 'demo':
+
+    rows = []
+    for number, line in enumerate(sys.stdin, start=1):
+        if not line.strip():
+            continue
+        try:
+            rows.append(convert(line.rstrip('\n').split('\t')))
+        except (IndexError, ValueError) as e:
+            parser.error(f"line {number}: {e or 'missing field'}")
+    return rows
+
+def _date_argument(value):
+    """argparse type for a YYYY-MM-DD date."""
+    import argparse
+
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date (expected YYYY-MM-DD): {value!r}")
+
+# Commands that parse their own arguments, and the module whose main(argv) runs each
+MODULE_COMMANDS = {'export': 'exporter', 'report': 'reports', 'backup': 'backup'}
+
+def _command_parser():
+    """The command-line parser and its subparsers action, with one subparser per command."""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='student_records.py',
+                                     description='Run a command, or with no command the interactive menu.')
+    commands = parser.add_subparsers(dest='command', metavar='COMMAND')
+    commands.add_parser('demo', help='run the scripted demonstration')
+    importing = commands.add_parser('import', help='load a CSV or Parquet file')
+    importing.add_argument('path')
+    importing.add_argument('table', nargs='?', choices=('students', 'attendance'),
+                           help='target table (default: inferred from the header)')
+    for name in MODULE_COMMANDS:
+        # Their own parsers handle the arguments and --help
+        commands.add_parser(name, add_help=False, help=f'see {name} --help')
+    adding = commands.add_parser('add', help='add students',
+                                 description='Add one student, or with no arguments one student per '
+                                             'line of name<TAB>grade read from standard input.')
+    adding.add_argument('name', nargs='?')
+    adding.add_argument('grade', type=float, nargs='?')
+    commands.add_parser('update', help='update students from standard input',
+                        description='Update students from lines of id<TAB>name<TAB>grade read '
+                                    'from standard input, as printed by list; a blank name or '
+                                    'grade is left as it is.')
+    deleting = commands.add_parser('delete', help='delete students and their attendance',
+                                   description='Delete students and all their attendance. With no '
+                                               'STUDENT_IDs, the first field of each line of standard '
+                                               'input is an id, so list output can be piped in.')
+    deleting.add_argument('student_ids', type=int, nargs='*', metavar='STUDENT_ID')
+    listing = commands.add_parser('list', help='print students',
+                                  description='Print each student as id, name and grade, tab-separated.')
+    listing.add_argument('--name', help='only students whose name contains this')
+    marking = commands.add_parser('mark', help="record one day's attendance")
+    marking.add_argument('status', choices=sorted(STATUS_CODES))
+    marking.add_argument('student_ids', type=int, nargs='+', metavar='STUDENT_ID')
+    marking.add_argument('--date', type=_date_argument, help='day to mark (YYYY-MM-DD, default today)')
+    summary = commands.add_parser('summary', help='print status totals and the average grade')
+    summary.add_argument('--start', type=_date_argument, help='first date (YYYY-MM-DD); needs --end')
+    summary.add_argument('--end', type=_date_argument, help='last date (YYYY-MM-DD); needs --start')
+    generating = commands.add_parser('generate', help='create a synthetic dataset')
+    generating.add_argument('--students', type=int, default=1000)
+    generating.add_argument('--days', type=int, default=180)
+    generating.add_argument('--absence', type=float, default=0.05, help='probability of Absent per day')
+    generating.add_argument('--seed', type=int, default=0)
+    generating.add_argument('--start', type=_date_argument, default='2023-09-01', help='first school day (YYYY-MM-DD)')
+    commands.add_parser('rebuild-counts', help='recreate the attendance count tables')
+    for name, text in (('compact', 'pack a finished term into bitsets'),
+                       ('archive', 'move a range of attendance to a read-only partition file')):
+        ranged = commands.add_parser(name, help=text)
+        ranged.add_argument('start', type=_date_argument, help='first date (YYYY-MM-DD)')
+        ranged.add_argument('end', type=_date_argument, help='last date (YYYY-MM-DD)')
+    for name, text in (('expand', 'turn a compacted term back into rows'),
+                       ('unarchive', 'move an archived partition back into the database')):
+        commands.add_parser(name, help=text).add_argument('start', type=_date_argument,
+                                                              help='first date of the term or partition')
+    commands.add_parser('diagnostics', add_help=False, help='run another command with profiling on')
+    return parser, commands
+
+def main(argv):
+    """Dispatch command-line arguments (without the program name); with none, run the menu."""
+    if not argv:
+        create_tables()
+        cli_menu()
+        return
+    parser, commands = _command_parser()
+    args, rest = parser.parse_known_args(argv)
+    command = args.command
+    if command is None:
+        # Only options were given, none of them known
+        parser.error(f"unrecognized arguments: {' '.join(rest)}")
+    parser = commands.choices[command]
+    if rest and command not in MODULE_COMMANDS and command != 'diagnostics':
+        parser.error(f"unrecognized arguments: {' '.join(rest)}")
+    if command == 'demo':
         demo()
-    else:
+    elif command == 'import':
+        import importer
+        create_tables()
+        errors = []
+        stats = importer.import_file(args.path, args.table, errors=errors)
+        for row, message in errors[:10]:
+            print(f"Skipped row {row}: {message}")
+        rate = stats['rows'] / stats['seconds'] if stats['seconds'] else 0
+        print(f"Imported {stats['rows']} {stats['table']} rows ({stats['skipped']} skipped) "
+              f"in {stats['seconds']:.2f} s, {rate:,.0f} rows/s.")
+    elif command in MODULE_COMMANDS:
+        import importlib
+        module = importlib.import_module(MODULE_COMMANDS[command])
+        create_tables()
+        module.main(rest)
+    elif command == 'add':
+        if args.name is not None and args.grade is None:
+            parser.error('NAME needs a GRADE')
+        if args.name is None:
+            students = _read_rows(parser, lambda fields: (fields[0], float(fields[1])))
+            create_tables()
+            print(f"Added {add_students(students)} students.")
+        else:
+            create_tables()
+            print(f"Added student {add_student(args.name, args.grade)}.")
+    elif command == 'update':
+        def update_row(fields):
+            student_id, name, grade = (fields + ['', ''])[:3]
+            return int(student_id), name or None, float(grade) if grade not in ('', 'None') else None
+        updates = _read_rows(parser, update_row)
+        create_tables()
+        print(f"Updated {update_students(updates)} students.")
+    elif command == 'delete':
+        student_ids = args.student_ids or _read_rows(parser, lambda fields: int(fields[0]))
         create_tables()
-        cli_menu()
\ No newline at end of file
+        print(f"Deleted {delete_students(student_ids)} students.")
+    elif command == 'list':
+        create_tables()
+        after_id = 0
+        while True:
+            page = get_students_page.uncached(after_id, BATCH_SIZE, args.name)
+            for student_id, name, grade in page:
+                print(f"{student_id}\t{name}\t{grade}")
+            if len(page) < BATCH_SIZE:
+                break
+            after_id = page[-1][0]
+    elif command == 'mark':
+        day = args.date or date.today().isoformat()
+        create_tables()
+        unknown = [sid for sid, in get_connection().execute(
+            'SELECT value FROM json_each(?) WHERE value NOT IN (SELECT id FROM students)',
+            (_student_ids_param(args.student_ids),))]
+        if unknown:
+            parser.error(f"unknown STUDENT_ID: {', '.join(map(str, unknown))}")
+        try:
+            inserted, updated = update_attendance_matrix({sid: {day: args.status} for sid in args.student_ids})
+        except sqlite3.IntegrityError as e:
+            # The day is in a compacted term or archived partition
+            parser.error(f"{day} cannot be marked: {e}")
+        print(f"Marked {len(args.student_ids)} students {args.status} on {day} "
+              f"({inserted} added, {updated} changed).")
+    elif command == 'summary':
+        if (args.start is None) != (args.end is None):
+            parser.error('--start and --end must be given together')
+        create_tables()
+        if args.start:
+            summary = get_attendance_summary_by_date_range(args.start, args.end)
+        else:
+            summary = get_attendance_summary()
+        for status, count in summary:
+            print(f"{status}\t{count}")
+        average = get_average_grade()
+        print(f"Average grade\t{'-' if average is None else f'{average:.2f}'}")
+    elif command == 'generate':
+        import time
+        create_tables()
+        start = time.perf_counter()
+        students, rows = generate_data(args.students, args.days, args.absence, args.seed, args.start)
+        print(f"Generated {students} students and {rows} attendance rows in {time.perf_counter() - start:.2f} s.")
+    elif command == 'rebuild-counts':
+        create_tables()
+        rebuild_attendance_counts()
+        print("Attendance counts rebuilt.")
+    elif command == 'compact':
+        create_tables()
+        compacted = compact_attendance(args.start, args.end)
+        get_connection().execute('VACUUM')
+        print(f"Compacted {compacted} attendance records from {args.start} to {args.end}.")
+    elif command == 'expand':
+        create_tables()
+        print(f"Restored {expand_attendance(args.start)} attendance records.")
+    elif command == 'archive':
+        create_tables()
+        moved = archive_attendance(args.start, args.end)
+        remove_stale_partitions()
+        get_connection().execute('VACUUM')
+        print(f"Archived {moved} attendance records from {args.start} to {args.end}.")
+    elif command == 'unarchive':
+        create_tables()
+        restored = unarchive_attendance(args.start)
+        remove_stale_partitions()
+        print(f"Restored {restored} attendance records.")
+    elif command == 'diagnostics':
+        # Run any other command with profiling on, then print what it spent its time on
+        with profiler.profiling():
+            main(rest)
+        print()
+        print(profiler.report())
+
+# Opt-in call statistics; costs one flag check per call unless profiling is enabled
+profiler.instrument_module(globals(), get_connection, exclude=('get_connection', 'main', 'cli_menu', 'demo',
+                                                               'to_day', 'to_date', 'to_status_code'))
+
+if __name__ == '__main__':
+    import sys
+    main(sys.argv[1:])